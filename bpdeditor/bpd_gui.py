@@ -1569,7 +1569,7 @@ class BPDWindow(QMainWindow):
             return False
         if len(node.data)<2 or 'BehaviorProviderDefinition' not in node.data[1]:
             return False
-        if not 'BehaviorSequences' in node.get_structure():
+        if not 'BehaviorSequences' in node.get_structure(lazy=True):
             return False
         return True
 
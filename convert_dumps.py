@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+
+# Copyright (c) 2018-2021, CJ Kucera
+# All rights reserved.
+#   
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Rewrites the dump files for one or more games into our "blocked" format,
+# where every few objects live in their own independently-decompressible
+# xz stream.  The result is still a regular xz file which can be read by
+# anything else, but it lets FT/BLCMM Explorer load an object without
+# decompressing everything in front of it.  The files are a bit larger
+# than a single-stream xz file would be, since the compressor can't make
+# use of data from previous blocks.
+#
+# Be sure to re-run `generate_indexes.py` after converting, so that the
+# index knows where all the blocks are.
+
+import os
+import sys
+import argparse
+from ftexplorer import dumps
+
+parser = argparse.ArgumentParser(
+    description='Convert FT-Explorer dump files to a seekable block-compressed format',
+    )
+
+parser.add_argument('-b', '--block-size',
+    type=int,
+    default=dumps.default_block_size//1024,
+    help='Minimum uncompressed size of each block, in KiB (default: %(default)s)',
+    )
+
+parser.add_argument('-f', '--force',
+    action='store_true',
+    default=False,
+    help='Re-convert files which are already block-compressed',
+    )
+
+parser.add_argument('games',
+    nargs='*',
+    help='Which game(s) to convert: bl2, tps, and/or aodk (default: all)',
+    )
+
+args = parser.parse_args()
+
+games = []
+for game in args.games or ['bl2', 'tps', 'aodk']:
+    if game.lower() not in ['bl2', 'tps', 'aodk']:
+        parser.error('invalid game: {}'.format(game))
+    game = game.upper()
+    if game == 'AODK':
+        game = 'AoDK'
+    games.append(game)
+
+for game in games:
+
+    print('Converting {} Game Data'.format(game))
+    print('------------------------')
+
+    game_dir = os.path.join('resources', game, 'dumps')
+    with os.scandir(game_dir) as it:
+        for entry in sorted(it, key=lambda e: getattr(e, 'name').lower()):
+            if entry.name[-8:] == '.dump.xz' or entry.name[-7:] == '.txt.xz':
+                if not args.force:
+                    try:
+                        if len(dumps.get_block_table(entry.path)) > 1:
+                            print('Skipping {} (already converted)'.format(entry.name))
+                            continue
+                    except ValueError as e:
+                        print('ERROR: {}'.format(e))
+                        sys.exit(1)
+                temp_path = '{}.new'.format(entry.path)
+                blocks = dumps.write_blocked_dump(entry.path, temp_path,
+                        block_size=args.block_size*1024)
+                os.replace(temp_path, entry.path)
+                print('Converted {} ({} blocks)'.format(entry.name, blocks))
+
+    print()
+
+print('Done!  Be sure to run generate_indexes.py to update the indexes.')
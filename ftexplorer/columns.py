@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+
+# Copyright (c) 2018-2021, CJ Kucera
+# All rights reserved.
+#   
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Support for `Data.extract_columns`, which pulls a handful of properties
+# out of every object of a type and hands them back column-by-column.  If
+# NumPy is available, each column is turned into an array (numbers into
+# numeric arrays, strings and object references into string arrays), and
+# if pandas is available the whole thing can be turned into a DataFrame.
+# Neither one is required; without NumPy, columns are just lists.  They're
+# only imported once they're actually needed, since pandas in particular
+# takes a while to load (and a lot of memory), and `data.py` imports us.
+
+import importlib
+from . import structure
+
+def import_optional(module_name):
+    """
+    Imports and returns the module `module_name`, or returns `None` if it
+    isn't available
+    """
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        return None
+
+def get_plain_value(value):
+    """
+    Returns `value` (a typed value) as it should be stored in a column:
+    object references become their object names, and everything else is
+    left alone
+    """
+    if type(value) == structure.ObjectRef:
+        return value.name
+    return value
+
+def to_array(values):
+    """
+    Turns the list `values` into a NumPy array, if we can.  Columns of ints
+    become int arrays (or float arrays, with NaN for missing values, if any
+    are missing), columns of numbers in general become float arrays,
+    columns of bools become bool arrays (if none are missing), and columns
+    of strings become string arrays, with missing values as empty strings.
+    Anything else (including columns of lists, from paths with `[*]` in
+    them) ends up in an array of Python objects.
+    """
+    numpy = import_optional('numpy')
+    if numpy is None:
+        return values
+    types = set(type(value) for value in values)
+    missing = type(None) in types
+    types.discard(type(None))
+    if types == {int} and not missing:
+        return numpy.array(values, dtype=numpy.int64)
+    if types and types <= {int, float}:
+        return numpy.array([numpy.nan if value is None else value for value in values], dtype=numpy.float64)
+    if types == {bool} and not missing:
+        return numpy.array(values, dtype=numpy.bool_)
+    if types == {str}:
+        return numpy.array(['' if value is None else value for value in values], dtype=numpy.str_)
+    array = numpy.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+def make_columns(names, columns, as_frame=False):
+    """
+    Builds the result of `Data.extract_columns`, from the list of object
+    `names` and the dict `columns` of paths to lists of values.  Returns
+    a dict of column names to columns (with the object names in the `name`
+    column), or a pandas DataFrame (indexed by object name) if `as_frame`
+    is `True`.
+    """
+    pandas = None
+    if as_frame:
+        pandas = import_optional('pandas')
+        if pandas is None:
+            raise ImportError('pandas is required to extract columns as a DataFrame')
+    result = {'name': to_array(names)}
+    for (path, values) in columns.items():
+        result[path] = to_array(values)
+    if as_frame:
+        return pandas.DataFrame(result).set_index('name')
+    return result
@@ -28,9 +28,19 @@
 
 import os
 import re
-import sys
 import lzma
-import json
+import pickle
+import atexit
+import bisect
+import weakref
+import threading
+import collections
+import collections.abc
+import concurrent.futures
+from . import dumps
+from . import index
+from . import columns
+from . import structure
 
 class Weight(object):
     """
@@ -157,62 +167,26 @@ class BalancedItems(object):
             ret_list.append('{}{}%: {}'.format(prefix, prob, title))
         return "\n".join(ret_list)
 
-class Node(object):
+class BaseNode(object):
     """
-    A node in our tree
+    The parts of a node in our tree which are shared between regular `Node`
+    objects and `StoreNode` views.  Subclasses provide the node's
+    attributes (`name`, `filename`, `pos_start`, `data` and so on).  This
+    has no instance attributes of its own, so that `StoreNode` can be fully
+    slotted.
     """
 
-    def __init__(self, name):
-        self.name = name
-        self.filename = None
-        self.pos_start = 0
-        self.length = 0
-        self.loaded = False
-        self.has_data = False
-        self.data = []
-        self.child_keys = None
-        self.children = {}
+    __slots__ = ()
 
     def __repr__(self):
         return self.name
 
-    def __getitem__(self, item):
-        """
-        Lets us behave somewhat like a list
-        """
-        if self.child_keys is None:
-            self.child_keys = sorted(self.children.keys(), key=str.lower)
-        return self.children[self.child_keys[item]]
-
     def __lt__(self, other):
         """
         Sorting, case-insensitively by name
         """
         return self.name.lower() < other.name.lower()
 
-    def start_data(self, obj_name_parts, game, filename, pos_start, length):
-        """
-        Starts recording data for the specified object.
-        Returns a list which can be appended to
-        """
-        if len(obj_name_parts) == 0:
-            self.filename = filename
-            self.pos_start = pos_start
-            self.length = length
-            self.game = game
-            self.has_data = True
-            self.data = []
-            return self.data
-        lower = obj_name_parts[0].lower()
-        if lower not in self.children:
-            self.children[lower] = Node(obj_name_parts[0])
-        return self.children[lower].start_data(
-                obj_name_parts[1:],
-                game,
-                filename,
-                pos_start,
-                length)
-
     def load_from_string_list(self, data):
         """
         Given a list of strings in `data`, "load" it in.
@@ -230,200 +204,88 @@ class Node(object):
         self.loaded = True
         return self.data
 
+    def load_from_bytes(self, raw):
+        """
+        Given the raw bytes of our object (or any other bytes-like object,
+        such as a memoryview), read in our data.  Returns the data that
+        we've loaded.
+        """
+        self.data = str(raw, 'latin1').splitlines()
+        self.loaded = True
+        return self.data
+
     def load(self):
         """
-        Loads ourselves from our data file
+        Loads ourselves from our data file.  If we belong to a `Data`
+        object, the read goes through that, so it can make use of its
+        open file handles.
         """
         if self.loaded or not self.has_data:
             return self.data
         if self.filename:
             try:
-                with lzma.open(os.path.join('resources', self.game, 'dumps', self.filename), 'rb') as df:
+                if self.game_data:
+                    return self.load_from_bytes(self.game_data.read_node_data(self))
+                filename = os.path.join('resources', self.game, 'dumps', self.filename)
+                if self.block:
+                    block_data = dumps.read_block(filename, self.block)
+                    return self.load_from_bytes(block_data[self.block_offset:self.block_offset+self.length])
+                with lzma.open(filename, 'rb') as df:
                     return self.load_from_open_file(df)
             except Exception as e:
                 return ['ERROR!  Could not load data: {}'.format(str(e))]
 
-    def parse_data_value(self, value):
+    def parse_data_value(self, value, typed=False):
         """
         Parses a structure inside our data - basically a property value,
-        but also any "sub" value that's inside parens in there.  This is
-        *highly* inefficient the way it's currently written -- those
-        parenthetical statements end up getting looped over multiple times
-        throughout here.  The code is also fairly laughable, so sorry about
-        that.  This isn't actually used by the GUI (thankfully).  It's
-        just here to support some data-inspection scripts.  Note that in
-        the event we get some data I didn't plan for, this function could
-        raise an Exception.
-
-        Note that this does NOT properly deal with quotes - if you have
-        something quoted which happens to have a comma in it, for instance,
-        things will probably go awry.
-        """
-        #print('parsing: {}'.format(value))
-        if len(value) == 0:
-            return value
-        elif value[0] == '(' and value[-1] == ')':
-            newdict = {}
-            cur_level = 0
-            cur_key = []
-            cur_value = []
-            cur_inner = []
-            state = 0
-            first_key_pass = False
-            for char in value[1:-1]:
-
-                # State 0 - reading key
-                if state == 0:
-                    if char == '=':
-                        state = 1
-                    elif first_key_pass and char == ',':
-                        pass
-                    else:
-                        cur_key.append(char)
-                    first_key_pass = False
-
-                # State 1 - reading value
-                elif state == 1:
-                    if char == ',':
-                        newdict[''.join(cur_key)] = self.parse_data_value(''.join(cur_value))
-                        cur_key = []
-                        cur_value = []
-                        cur_inner = []
-                        first_key_pass = True
-                        state = 0
-                    elif char == '(':
-                        cur_level += 1
-                        cur_inner.append(char)
-                        state = 2
-                    else:
-                        cur_value.append(char)
-
-                # State 2 - Reading first char of an inner paren stanza
-                elif state == 2:
-                    if char == '(':
-                        newdict[''.join(cur_key)] = []
-                        state = 4
-                        at_first = True
-                    else:
-                        state = 3
-
-                # State 3 - reading a regular inner dict
-                if state == 3:
-                    if char == '(':
-                        cur_level += 1
-                    elif char == ')':
-                        cur_level -= 1
-                    cur_inner.append(char)
-                    if cur_level == 0:
-                        newdict[''.join(cur_key)] = self.parse_data_value(''.join(cur_inner[1:-1]))
-                        cur_key = []
-                        cur_value = []
-                        cur_inner = []
-                        first_key_pass = True
-                        state = 0
-
-                # State 4 - Reading a list
-                elif state == 4:
-                    if char == '(':
-                        cur_level += 1
-                        if not at_first:
-                            cur_inner.append(char)
-                    elif char == ')':
-                        cur_level -= 1
-                        cur_inner.append(char)
-
-                        if cur_level == 1:
-                            newdict[''.join(cur_key)].append(self.parse_data_value(''.join(cur_inner)))
-                            cur_inner = []
-
-                        elif cur_level == 0:
-                            cur_key = []
-                            cur_value = []
-                            cur_inner = []
-                            first_key_pass = True
-                            state = 0
-
-                    elif cur_level == 1 and char == ',':
-                        pass
-
-                    else:
-                        cur_inner.append(char)
-
-                    at_first = False
-
-            # Clean up, depending on our state
-            if state == 0:
-                pass
-            elif state == 1:
-                newdict[''.join(cur_key)] = self.parse_data_value(''.join(cur_value))
-            else:
-                raise Exception("shouldn't be able to get here")
-
-            return newdict
-        else:
-
-            # Check for quoted values, and don't split commas inside them.
-            # Also don't try to parse mismatched quotes.  We're just being
-            # even more stupid about it and converting commas in quotes to
-            # unicode snowmen, temporarily
-            new_value = value
-            replace_comma = u"\u2603"
-            quote_parts = value.split('"')
-            if len(quote_parts) > 1 and len(quote_parts) % 2 == 1:
-                new_val_list = []
-                for (idx, part) in enumerate(quote_parts):
-                    if idx % 2 == 1:
-                        new_val_list.append(part.replace(',', replace_comma))
-                    else:
-                        new_val_list.append(part)
-                new_value = '"'.join(new_val_list)
-
-            parts = [p.replace(replace_comma, ',') for p in new_value.split(',')]
-            if len(parts) == 1:
-                # See the comment on the other side of the `if` here.  We may have
-                # a single-element dict.
-                if '=' in value:
-                    newdict = {}
-                    (key, val) = value.split('=', 1)
-                    newdict[key] = val
-                    return newdict
-                else:
-                    return value
-            else:
-                # This is hokey, and a byproduct of the stupid way we're parsing
-                # this stuff (and is susceptible to corner cases) - anyway, at
-                # this point we MAY have a dict, or we may just have a string
-                # which happens to have a comma in it.  We'll just test the first
-                # element and see if there's an equals sign in it.  If it does,
-                # then we'll parse it as a dict.  If not, just return as a string.
-                if '=' in parts[0]:
-                    newdict = {}
-                    for part in parts:
-                        (key, val) = part.split('=', 1)
-                        newdict[key] = val
-                    return newdict
-                else:
-                    return value
+        but also any "sub" value that's inside parens in there.  Structs
+        become dicts, lists of structs become lists, and everything else
+        is a string (unless `typed` is `True`, in which case numbers,
+        object references and the like get decoded); see `structure.py`
+        for the details.  This isn't actually used by the GUI.  It's just
+        here to support some data-inspection scripts.
+        """
+        return structure.parse_value(value, typed)
 
-    def get_structure(self):
+    def get_structure(self, lazy=False, typed=False):
         """
         Returns ourselves as a data structure of lists/dicts.  This is
         not actually used by the GUI at the moment - it's just here to
-        support some data-inspection scripts I'm writing.
+        support some data-inspection scripts I'm writing.  If our `Data`
+        object has a structure cache, we'll go through that, so we only
+        have to be parsed once.  If `lazy` is `True`, we'll instead return
+        a read-only `structure.LazyStructure`, which only parses the
+        properties which actually get looked at (and doesn't use the
+        structure cache); that's much faster if you only want one or two
+        properties out of a big object.  If `typed` is `True`, the values
+        in the structure will be ints, floats, bools, `None` and
+        `structure.ObjectRef`s where appropriate, rather than all strings
+        (see `structure.decode_value`).
+        """
+        if lazy:
+            return structure.LazyStructure(self.load(), typed)
+        if self.game_data is not None and self.game_data.struct_cache is not None and self.filename:
+            return self.game_data.struct_cache.get_structure(self, typed)
+        return self.parse_structure(typed)
+
+    def parse_structure(self, typed=False):
+        """
+        Parses our data into a data structure of lists/dicts (see
+        `get_structure`).
         """
         main = {}
         for line in self.load():
-            match = re.match('^\s*([A-Za-z0-9_]+)(\((\d+)\))?=(.*)$', line)
+            match = structure.property_line_re.match(line)
             if match:
                 key = match.group(1)
                 index = match.group(3)
                 value = match.group(4)
                 if index is None:
-                    main[key] = self.parse_data_value(value)
+                    main[key] = self.parse_data_value(value, typed)
                 else:
                     if key not in main:
                         main[key] = []
-                    main[key].append(self.parse_data_value(value))
+                    main[key].append(self.parse_data_value(value, typed))
             #else:
             #    print(line)
         return main
@@ -438,6 +300,593 @@ class Node(object):
             if childname.lower().startswith(prefix):
                 yield child
 
+class Node(BaseNode):
+    """
+    A node in our tree
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.filename = None
+        self.pos_start = 0
+        self.length = 0
+        self.block = None
+        self.block_offset = 0
+        self.game_data = None
+        self.loaded = False
+        self.has_data = False
+        self.data = []
+        self.child_keys = None
+        self.children = {}
+
+    def __getitem__(self, item):
+        """
+        Lets us behave somewhat like a list
+        """
+        if self.child_keys is None:
+            self.child_keys = sorted(self.children.keys(), key=str.lower)
+        return self.children[self.child_keys[item]]
+
+    def start_data(self, obj_name_parts, game, filename, pos_start, length,
+            block=None, block_offset=0, game_data=None):
+        """
+        Starts recording data for the specified object.
+        Returns a list which can be appended to.  If the object's data
+        file is block-compressed, `block` should be the block table entry
+        for the block which holds the object, and `block_offset` its
+        position inside that block.  `game_data` is the `Data` object
+        which we'll read our data through, if any.
+        """
+        if len(obj_name_parts) == 0:
+            self.filename = filename
+            self.pos_start = pos_start
+            self.length = length
+            self.block = block
+            self.block_offset = block_offset
+            self.game_data = game_data
+            self.game = game
+            self.has_data = True
+            self.data = []
+            return self.data
+        lower = obj_name_parts[0].lower()
+        if lower not in self.children:
+            self.children[lower] = Node(obj_name_parts[0])
+        return self.children[lower].start_data(
+                obj_name_parts[1:],
+                game,
+                filename,
+                pos_start,
+                length,
+                block,
+                block_offset,
+                game_data)
+
+class ObjectCache(object):
+    """
+    A least-recently-used cache of loaded object data (lists of lines),
+    keyed by node ID, which holds at most `max_bytes` of data (roughly; the
+    size of each object is estimated).  A single object which is larger
+    than the budget will still be kept until something else is loaded.
+    `max_bytes` of `None` means the cache is unbounded.  Keeps track of
+    hits, misses and evictions, for the curious.
+    """
+
+    # Rough per-line and per-object overhead, in bytes, of a list of str
+    line_overhead = 57
+    object_overhead = 56
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        Returns the data for `key`, or `None` if we don't have it
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+            return None
+
+    def put(self, key, data):
+        """
+        Stores `data` for `key`, evicting older entries if we're over budget
+        """
+        size = self.object_overhead + sum(len(line) for line in data) + self.line_overhead*len(data)
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (data, size)
+            self.size += size
+            if self.max_bytes is not None:
+                while self.size > self.max_bytes and len(self.entries) > 1:
+                    (old_data, old_size) = self.entries.popitem(last=False)[1]
+                    self.size -= old_size
+                    self.evictions += 1
+
+    def discard(self, key):
+        """
+        Drops the data for `key`, if we have it
+        """
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+
+    def clear(self):
+        """
+        Drops everything
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def get_stats(self):
+        """
+        Returns a dict of statistics about the cache
+        """
+        with self.lock:
+            return {
+                    'objects': len(self.entries),
+                    'bytes': self.size,
+                    'max_bytes': self.max_bytes,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    }
+
+class StructCache(object):
+    """
+    An on-disk cache of parsed object structures (as returned by
+    `Node.get_structure`), so that scripts which look at the same objects
+    over and over don't have to parse them every time.  There's one cache
+    file per dump file, in `cache_dir`, holding the pickled structure of
+    every object we've parsed from it, keyed by the object's start
+    position (typed structures are kept separately from the plain ones).
+    Each cache file records the size, mtime and hash of the dump file it
+    came from; if the size or mtime have changed we check the hash, and
+    throw out the whole cache file if that's changed too.
+
+    Cache files are read the first time an object from their dump file is
+    asked for, and new structures are only written out when `flush` is
+    called (which happens automatically when the process exits).
+    Structures are kept pickled in memory as well, so callers are free to
+    modify the structures they're given.
+    """
+
+    # Bump this whenever the structures `Node.get_structure` returns change
+    version = 4
+
+    def __init__(self, game_data, cache_dir):
+        self.game_data = game_data
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.files = {}
+        atexit.register(StructCache.flush_at_exit, weakref.ref(self))
+
+    @staticmethod
+    def flush_at_exit(cache_ref):
+        """
+        Flushes the cache behind the weak reference `cache_ref`, if it's
+        still around.  This is what gets registered with `atexit`, so that
+        the registration doesn't keep the cache (and its game data) alive.
+        """
+        cache = cache_ref()
+        if cache is not None:
+            cache.flush()
+
+    def get_cache_path(self, filename):
+        """
+        Returns the path to the cache file for the given dump file
+        """
+        return os.path.join(self.cache_dir, '{}.structs'.format(self.game_data.get_cache_name(filename)))
+
+    def get_file(self, filename):
+        """
+        Returns the cache entry for the given dump file, reading in its
+        cache file if need be.  The entry is a dict with the dump file's
+        `source_size`, `source_mtime_ns` and `source_hash`, the `structs`
+        and `typed_structs` dicts of start positions to pickled structures,
+        and whether or not it's `dirty` (needs to be written out).
+        """
+        if filename in self.files:
+            return self.files[filename]
+        source = self.game_data.get_dump_path(filename)
+        stat = os.stat(source)
+        entry = None
+        try:
+            with open(self.get_cache_path(filename), 'rb') as df:
+                entry = pickle.load(df)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            entry = None
+
+        # See if the cache file is still valid.  Size+mtime is good enough
+        # if they match; otherwise fall back to the hash.
+        if entry is not None:
+            if entry.get('version') != self.version or entry['source_size'] != stat.st_size:
+                entry = None
+            elif entry['source_mtime_ns'] != stat.st_mtime_ns:
+                if entry['source_hash'] == dumps.file_hash(source):
+                    entry['source_mtime_ns'] = stat.st_mtime_ns
+                    entry['dirty'] = True
+                else:
+                    entry = None
+        if entry is None:
+            entry = {
+                    'version': self.version,
+                    'source_size': stat.st_size,
+                    'source_mtime_ns': stat.st_mtime_ns,
+                    'source_hash': dumps.file_hash(source),
+                    'structs': {},
+                    'typed_structs': {},
+                    'dirty': False,
+                    }
+        self.files[filename] = entry
+        return entry
+
+    def get_structure(self, node, typed=False):
+        """
+        Returns the structure of the given node, parsing it (and saving
+        the result) if it's not already in the cache.  `typed` is as in
+        `Node.get_structure`.
+        """
+        try:
+            (pos_start, length) = self.game_data.locate_node(node)
+        except KeyError:
+            return node.parse_structure(typed)
+        if typed:
+            structs_key = 'typed_structs'
+        else:
+            structs_key = 'structs'
+        with self.lock:
+            entry = self.get_file(node.filename)
+            pickled = entry[structs_key].get(pos_start)
+        if pickled is not None:
+            return pickle.loads(pickled)
+        structure = node.parse_structure(typed)
+        # Don't save anything if the data couldn't actually be loaded
+        if node.loaded:
+            with self.lock:
+                entry[structs_key][pos_start] = pickle.dumps(structure, pickle.HIGHEST_PROTOCOL)
+                entry['dirty'] = True
+        return structure
+
+    def flush(self):
+        """
+        Writes out any cache files which have new structures in them
+        """
+        with self.lock:
+            for (filename, entry) in self.files.items():
+                if not entry['dirty']:
+                    continue
+                cache_path = self.get_cache_path(filename)
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                temp_path = '{}.new'.format(cache_path)
+                entry['dirty'] = False
+                with open(temp_path, 'wb') as df:
+                    pickle.dump(entry, df, pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, cache_path)
+
+class NodeStore(object):
+    """
+    Holds the object tree for a game as a set of flat arrays (see
+    `index.py`), rather than as a tree of `Node` objects, which uses
+    a *lot* less memory.  `StoreNode` objects are created on demand to
+    provide the usual `Node` interface on top of it.  Loaded object data
+    is kept in the `Data` object's `ObjectCache`, keyed by node ID, since
+    the `StoreNode` objects themselves come and go.
+    """
+
+    def __init__(self, game_data, tree):
+        self.game_data = game_data
+        self.game = game_data.game
+        self.tree = tree
+        self.names = tree.names
+        self.filenames = list(tree.files)
+        self.block_tables = [tree.get_block_table(file_id) for file_id in range(len(self.filenames))]
+        self.object_cache = game_data.object_cache
+        self.class_ids = {obj_class: class_id for (class_id, obj_class) in enumerate(tree.classes)}
+
+    def __len__(self):
+        return len(self.tree)
+
+    def get_node(self, node_id):
+        """
+        Returns a `StoreNode` for the given node ID
+        """
+        return StoreNode(self, node_id)
+
+    def get_name(self, node_id):
+        """
+        Returns the name of the given node ID
+        """
+        return self.names[self.tree.node_name[node_id]]
+
+    def get_full_name(self, node_id):
+        """
+        Returns the full object name of the given node ID, such as
+        `GD_Foo.Bar:Baz`.  Collapsed levels in the tree (like `GD_Foo_*`)
+        aren't part of the name.
+        """
+        parts = []
+        while node_id != 0:
+            name = self.get_name(node_id)
+            parent_id = self.tree.node_parent[node_id]
+            if not name.endswith('*'):
+                parts.append(name)
+                if parent_id != 0 and not self.get_name(parent_id).endswith('*'):
+                    # Older indexes don't know the separators; guess.
+                    sep = 0
+                    if self.tree.node_sep is not None:
+                        sep = self.tree.node_sep[node_id]
+                    parts.append(chr(sep) if sep else '.')
+            node_id = parent_id
+        return ''.join(reversed(parts))
+
+    def get_class_nodes(self, obj_class):
+        """
+        Returns the node IDs of all objects of class `obj_class`, sorted by
+        object name.  Only works for indexes which store object classes.
+        """
+        class_id = self.class_ids.get(obj_class)
+        if class_id is None:
+            return []
+        return self.tree.class_nodes[self.tree.class_first[class_id]:self.tree.class_first[class_id+1]]
+
+    def get_referrer_nodes(self, name):
+        """
+        Returns the node IDs of all objects which reference the object
+        `name`, from our index's reverse-reference table.  Only works for
+        indexes which have that table.
+        """
+        tree = self.tree
+        name = name.lower()
+        ref_id = None
+        try:
+            node_id = self.game_data.get_node_by_full_object(name).node_id
+        except KeyError:
+            node_id = None
+        if node_id is not None and self.get_full_name(node_id).lower() == name:
+            idx = bisect.bisect_left(tree.ref_target_nodes, node_id)
+            if idx < len(tree.ref_target_nodes) and tree.ref_target_nodes[idx] == node_id:
+                ref_id = idx
+        else:
+            idx = bisect.bisect_left(tree.ref_targets, name)
+            if idx < len(tree.ref_targets) and tree.ref_targets[idx] == name:
+                ref_id = len(tree.ref_target_nodes) + idx
+        if ref_id is None:
+            return []
+        return tree.ref_nodes[tree.ref_first[ref_id]:tree.ref_first[ref_id+1]]
+
+    def get_property_nodes(self, prop):
+        """
+        Returns the node IDs of all objects which define the top-level
+        property `prop` (case-sensitive), from our index's property table.
+        Only works for indexes which have that table.
+        """
+        tree = self.tree
+        idx = bisect.bisect_left(tree.props, prop)
+        if idx == len(tree.props) or tree.props[idx] != prop:
+            return []
+        return tree.prop_nodes[tree.prop_first[idx]:tree.prop_first[idx+1]]
+
+    def find_child(self, node_id, key):
+        """
+        Returns the node ID of the child of `node_id` whose lowercase name
+        is `key`, or `None`.  Children are sorted by lowercase name, so
+        this is just a binary search.
+        """
+        low = self.tree.node_first_child[node_id]
+        high = low + self.tree.node_child_count[node_id]
+        while low < high:
+            mid = (low+high)//2
+            name = self.get_name(mid).lower()
+            if name < key:
+                low = mid + 1
+            elif name > key:
+                high = mid
+            else:
+                return mid
+        return None
+
+class ChildMap(collections.abc.Mapping):
+    """
+    Read-only dict-like view of the children of a `StoreNode`, keyed by
+    lowercase name, like `Node.children`.
+    """
+
+    def __init__(self, store, node_id):
+        self.store = store
+        self.node_id = node_id
+
+    def __getitem__(self, key):
+        child_id = self.store.find_child(self.node_id, key)
+        if child_id is None:
+            raise KeyError(key)
+        return self.store.get_node(child_id)
+
+    def __contains__(self, key):
+        return self.store.find_child(self.node_id, key) is not None
+
+    def __iter__(self):
+        first = self.store.tree.node_first_child[self.node_id]
+        for child_id in range(first, first+len(self)):
+            yield self.store.get_name(child_id).lower()
+
+    def __len__(self):
+        return self.store.tree.node_child_count[self.node_id]
+
+class StoreNode(BaseNode):
+    """
+    A `Node` which is just a thin view onto a single node inside a
+    `NodeStore`.  These can be created and thrown away freely; two of them
+    compare equal if they point at the same node.  Our loaded data lives in
+    our `Data` object's `ObjectCache`, so it may get evicted; if so, it's
+    just loaded again the next time it's asked for.
+    """
+
+    __slots__ = ('store', 'node_id')
+
+    def __init__(self, store, node_id):
+        self.store = store
+        self.node_id = node_id
+
+    def __eq__(self, other):
+        return isinstance(other, StoreNode) and self.store is other.store and self.node_id == other.node_id
+
+    def __hash__(self):
+        return hash((id(self.store), self.node_id))
+
+    def __getitem__(self, item):
+        """
+        Lets us behave somewhat like a list
+        """
+        count = self.store.tree.node_child_count[self.node_id]
+        if item < 0:
+            item += count
+        if item < 0 or item >= count:
+            raise IndexError('child index out of range')
+        return self.store.get_node(self.store.tree.node_first_child[self.node_id] + item)
+
+    def __deepcopy__(self, memo):
+        """
+        Copies ourselves into a regular, standalone `Node` (without any
+        children).  Used by the BPD Editor.
+        """
+        node = Node(self.name)
+        for attr in ['filename', 'pos_start', 'length', 'block', 'block_offset',
+                'game', 'game_data', 'has_data', 'loaded']:
+            setattr(node, attr, getattr(self, attr))
+        node.data = list(self.data)
+        return node
+
+    @property
+    def name(self):
+        return self.store.get_name(self.node_id)
+
+    @property
+    def children(self):
+        return ChildMap(self.store, self.node_id)
+
+    @property
+    def child_keys(self):
+        return list(self.children)
+
+    @property
+    def has_data(self):
+        return self.store.tree.node_file[self.node_id] >= 0
+
+    @property
+    def filename(self):
+        file_id = self.store.tree.node_file[self.node_id]
+        if file_id < 0:
+            return None
+        return self.store.filenames[file_id]
+
+    @property
+    def pos_start(self):
+        return self.store.tree.node_pos[self.node_id]
+
+    @property
+    def length(self):
+        return self.store.tree.node_length[self.node_id]
+
+    @property
+    def block(self):
+        # As with the JSON index, we only bother with blocks if the file
+        # actually has more than one.
+        file_id = self.store.tree.node_file[self.node_id]
+        block_id = self.store.tree.node_block[self.node_id]
+        if file_id < 0 or block_id < 0:
+            return None
+        blocks = self.store.block_tables[file_id]
+        if len(blocks) < 2:
+            return None
+        return blocks[block_id]
+
+    @property
+    def block_offset(self):
+        return self.store.tree.node_block_offset[self.node_id]
+
+    @property
+    def obj_class(self):
+        if not self.store.tree.has_classes:
+            return None
+        class_id = self.store.tree.node_class[self.node_id]
+        if class_id < 0:
+            return None
+        return self.store.tree.classes[class_id]
+
+    @property
+    def game(self):
+        return self.store.game
+
+    @property
+    def game_data(self):
+        return self.store.game_data
+
+    @property
+    def loaded(self):
+        return self.node_id in self.store.object_cache
+
+    @loaded.setter
+    def loaded(self, value):
+        if not value:
+            self.store.object_cache.discard(self.node_id)
+
+    @property
+    def data(self):
+        return self.load()
+
+    @data.setter
+    def data(self, value):
+        self.store.object_cache.put(self.node_id, value)
+
+    def load_from_string_list(self, data):
+        """
+        Given a list of strings in `data`, "load" it in.
+        """
+        self.store.object_cache.put(self.node_id, data)
+
+    def load_from_bytes(self, raw):
+        """
+        Given the raw bytes of our object (or any other bytes-like object,
+        such as a memoryview), read in our data.  Returns the data that
+        we've loaded.
+        """
+        data = str(raw, 'latin1').splitlines()
+        self.store.object_cache.put(self.node_id, data)
+        return data
+
+    def load(self):
+        """
+        Returns our data, loading it from our data file if it's not already
+        in the cache.
+        """
+        data = self.store.object_cache.get(self.node_id)
+        if data is not None:
+            return data
+        if not self.has_data:
+            return []
+        try:
+            return self.load_from_bytes(self.game_data.read_node_data(self))
+        except Exception as e:
+            return ['ERROR!  Could not load data: {}'.format(str(e))]
+
 class Data(object):
     """
     Top-level data object to hold everything we're interested in.
@@ -578,26 +1027,107 @@ class Data(object):
             ],
     }
 
-    def __init__(self, game):
+    # Default size of our in-memory cache of loaded objects, in bytes
+    default_memory_budget = 512*1024*1024
+
+    # Maximum number of structures `walk` keeps around between walks
+    max_walk_structs = 20000
+
+    def __init__(self, game, cache_dir=None, cache_size=None, index_format=None,
+            memory_budget=default_memory_budget, struct_cache_dir=None):
+        """
+        Initializes data for the given `game`.  If `cache_dir` is given,
+        dump files will be decompressed into that directory as they're
+        used, and objects served out of memory-mapped copies of those;
+        `cache_size` is the maximum total size of that cache, in bytes.
+        `index_format` can be used to force the use of a `json` or
+        `binary` index; by default we use whichever is newest, and if
+        that's the JSON index, it gets converted to a binary index for
+        next time (see `load_json_index`).
+        `memory_budget` is the (approximate) maximum number of bytes of
+        loaded object data to keep in memory; the least-recently-used
+        objects will be dropped (and re-loaded if needed) past that.  Use
+        `None` to keep everything.  If `struct_cache_dir` is given, parsed
+        object structures are saved in that directory (see `StructCache`),
+        so later runs won't have to parse them again.
+        """
 
         self.top = Node('')
+        self.store = None
         self.game = game
+        self.object_cache = ObjectCache(memory_budget)
+        self.reader = dumps.DumpReader()
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = dumps.DumpCache(cache_dir, max_size=cache_size)
+        self.file_states = {}
+        self.rescans = {}
+        self.verified = {}
+        self.file_lock = threading.Lock()
+        self.struct_cache = None
+        if struct_cache_dir is not None:
+            self.struct_cache = StructCache(self, struct_cache_dir)
+        # Structures of the objects `walk` has been through, keyed by
+        # lowercased object name and whether they're typed, in
+        # least-recently-used order (see `load_walk_structs`)
+        self.walk_structs = collections.OrderedDict()
 
         # Read in our index
-        index_filename = os.path.join('resources', game, 'dumps', 'index.json.xz')
-        index = []
-        if os.path.exists(index_filename):
-            with lzma.open(index_filename, 'rt') as df:
-                index = json.load(df)
-
-        # Populate our basic node tree
-        for (filename, filename_data) in index.items():
-            for (parts, pos_start, length) in filename_data:
-                self.top.start_data(parts,
-                        game=game,
-                        filename=filename,
-                        pos_start=pos_start,
-                        length=length)
+        (found_format, index_filename) = index.find_index(os.path.join('resources', game, 'dumps'))
+        requested_format = index_format
+        if index_format is not None and index_format != found_format:
+            index_filename = os.path.join('resources', game, 'dumps', index.index_names[index_format])
+            if not os.path.exists(index_filename):
+                raise FileNotFoundError('No {} index found for {}'.format(index_format, game))
+        else:
+            index_format = found_format
+        if index_format == 'binary':
+            self.load_binary_index(index_filename)
+        elif index_format == 'json':
+            self.load_json_index(index_filename, convert=(requested_format is None))
+        if self.store is not None:
+            self.check_files()
+
+    def load_json_index(self, index_filename, convert=False):
+        """
+        Populates our node tree from the JSON index at `index_filename`.  If
+        `convert` is `True`, the tree is also written out as a binary index
+        alongside it, and used from there.  Later runs will pick that up
+        instead (see `index.find_index`), which is a lot quicker, and uses
+        less memory.  If the binary index can't be written, we just carry
+        on with the tree we've got.
+        """
+        tree = index.read_json_tree(index_filename)
+        if convert:
+            binary_filename = os.path.join(os.path.dirname(index_filename), index.binary_index_name)
+            temp_filename = '{}.{}.new'.format(binary_filename, os.getpid())
+            try:
+                index.write_binary_tree(temp_filename, tree, tree.manifest)
+                os.replace(temp_filename, binary_filename)
+            except OSError:
+                try:
+                    os.remove(temp_filename)
+                except OSError:
+                    pass
+            else:
+                self.load_binary_index(binary_filename)
+                return
+        self.load_tree(tree)
+
+    def load_binary_index(self, index_filename):
+        """
+        Populates our node tree from the binary index at `index_filename`.
+        The tree is used straight out of the (memory-mapped) index file.
+        """
+        self.load_tree(index.BinaryIndex(index_filename))
+
+    def load_tree(self, tree):
+        """
+        Uses the given tree (either an `index.TreeArrays` or an
+        `index.BinaryIndex`) as our node tree.
+        """
+        self.store = NodeStore(self, tree)
+        self.top = self.store.get_node(0)
 
     def __getitem__(self, item):
         """
@@ -605,35 +1135,536 @@ class Data(object):
         """
         return self.top[item]
 
-    def get_all_by_type(self, obj_type):
+    def __deepcopy__(self, memo):
         """
-        Returns a list of all objects of the given type.  This could be more
-        efficient if we had a type index, perhaps, but it's pretty good.  At
-        least, much better than we had before.  Data is saved/cached in the
-        Node structure itself.  Note that the object type is case-sensitive,
-        and must match the data filename.  Returns a list of the objects
-        loaded.
+        There's only ever one of us per game; copies of our nodes (such as
+        the BPD Editor makes) should just point back at us.
+        """
+        return self
+
+    def get_dump_path(self, filename):
+        """
+        Returns the full path to the given dump file
+        """
+        return os.path.join('resources', self.game, 'dumps', filename)
+
+    def get_cache_name(self, filename):
         """
-        objects = []
-        node = None
-        data = []
-        with lzma.open(os.path.join('resources', self.game, 'dumps',
-                '{}.dump.xz'.format(obj_type)), 'rt', encoding='latin1') as df:
-            for line in df.readlines():
-                match = re.match('^\*\*\* Property dump for object \'\S+ (\S+)\'.*$', line)
-                if match:
-                    objects.append(match.group(1))
-                    if node:
-                        node.load_from_string_list(data)
-                    data = [line]
-                    node = self.get_node_by_full_object(match.group(1))
+        Returns the name of the given dump file inside our uncompressed
+        cache, if we're using one.
+        """
+        return os.path.join(self.game, os.path.splitext(filename)[0])
+
+    def check_files(self):
+        """
+        Checks our dump files against the manifest in our index, if it has
+        one, so that we don't serve up the wrong data if a dump file has
+        been changed without regenerating the index.  This is just a quick
+        check of each file's size and mtime.  Files whose mtime doesn't
+        match are still fine if we've already checked their hash since
+        they were last touched (see `index.read_verified`); otherwise
+        they're marked as `suspect`, and their hash gets checked the first
+        time we load an object from them (see `verify_file`).  Returns a
+        list of the suspect files.
+        """
+        manifest = self.store.tree.get_manifest()
+        if manifest is None:
+            return []
+        self.verified = index.read_verified(self.get_dump_path(index.verified_name))
+        for filename in self.store.filenames:
+            info = manifest.get(filename)
+            try:
+                stat = os.stat(self.get_dump_path(filename))
+            except OSError:
+                # Loading will fail with a sensible error, regardless
+                continue
+            if info is None or info['size'] != stat.st_size:
+                self.file_states[filename] = 'suspect'
+            elif info['mtime_ns'] != stat.st_mtime_ns and self.verified.get(filename) != dict(info, mtime_ns=stat.st_mtime_ns):
+                self.file_states[filename] = 'suspect'
+        return sorted(self.file_states.keys())
+
+    def verify_file(self, filename):
+        """
+        Makes sure that the offsets in our index are still good for the
+        given dump file.  If the file was marked as suspect by
+        `check_files`, its hash is compared against our manifest.  If that
+        matches, the file's current mtime is saved (see
+        `index.write_verified`) so that we won't need to hash it again; if
+        not, the file is marked as `stale` and rescanned to find out where
+        its objects are now.  Returns `True` if the file's objects are
+        where our index says they are.
+        """
+        if filename not in self.file_states:
+            return True
+        with self.file_lock:
+            if self.file_states.get(filename) == 'suspect':
+                info = self.store.tree.get_manifest().get(filename)
+                path = self.get_dump_path(filename)
+                stat = os.stat(path)
+                if info is not None and info['size'] == stat.st_size and info['hash'] == dumps.file_hash(path):
+                    del self.file_states[filename]
+                    self.verified[filename] = dict(info, mtime_ns=stat.st_mtime_ns)
+                    index.write_verified(self.get_dump_path(index.verified_name), self.verified)
+                else:
+                    # Keyed without separators, since older indexes can't
+                    # tell us whether a name had a `.` or a `:` in it.
+                    positions = {}
+                    with self.open_dump(filename) as df:
+                        for (obj_type, obj_name, pos_start, raw) in dumps.scan_objects(df):
+                            positions[obj_name.lower().replace(':', '.')] = (pos_start, len(raw))
+                    self.rescans[filename] = positions
+                    self.file_states[filename] = 'stale'
+            return filename not in self.file_states
+
+    def get_stale_files(self):
+        """
+        Returns a sorted list of the dump files which we've found to have
+        changed since our index was generated (so far; files are only
+        verified once we load something from them).
+        """
+        return sorted(filename for (filename, state) in self.file_states.items() if state == 'stale')
+
+    def get_changed_files(self):
+        """
+        Verifies all the dump files which `check_files` marked as suspect
+        (see `verify_file`), and returns a set of the ones which have
+        changed since our index was generated.  The index's reference and
+        property tables can't be trusted for objects in those files.
+        """
+        for filename in list(self.file_states.keys()):
+            self.verify_file(filename)
+        return set(self.get_stale_files())
+
+    def locate_node(self, node):
+        """
+        Returns a tuple of the uncompressed start position and length of
+        the given node's object in its dump file.  That's just what our
+        index says, unless the file has changed since then, in which case
+        it comes from rescanning the file.  Raises `KeyError` if the object
+        isn't in the file anymore.
+        """
+        if self.verify_file(node.filename):
+            return (node.pos_start, node.length)
+        name = self.store.get_full_name(node.node_id)
+        try:
+            return self.rescans[node.filename][name.lower().replace(':', '.')]
+        except KeyError:
+            raise KeyError('{} is no longer in {}; regenerate the index'.format(name, node.filename))
+
+    def read_node_data(self, node):
+        """
+        Returns the raw bytes for the given node's object.  If we have an
+        uncompressed cache, that's used (and we return a memoryview rather
+        than bytes).  Block-compressed files just need the one block
+        decompressed; otherwise we read via our pool of open file handles,
+        which keeps in-order loads from decompressing the same data over
+        and over.  If the dump file has changed since our index was
+        generated, we read from wherever the object is now (see
+        `locate_node`).
+        """
+        filename = self.get_dump_path(node.filename)
+        if not self.verify_file(node.filename):
+            (pos_start, length) = self.locate_node(node)
+            if self.cache:
+                return self.cache.read(filename, self.get_cache_name(node.filename), pos_start, length)
+            return self.reader.read(filename, pos_start, length)
+        if self.cache:
+            return self.cache.read(filename, self.get_cache_name(node.filename),
+                    node.pos_start, node.length)
+        if node.block:
+            block_data = self.reader.read_block(filename, node.block)
+            return block_data[node.block_offset:node.block_offset+node.length]
+        return self.reader.read(filename, node.pos_start, node.length)
+
+    def get_cache_stats(self):
+        """
+        Returns a dict of statistics about our in-memory object cache
+        (see `ObjectCache.get_stats`).
+        """
+        return self.object_cache.get_stats()
+
+    def close(self):
+        """
+        Closes any dump files we've got open, empties our `walk` memo, and
+        writes out any new entries in our structure cache
+        """
+        self.reader.close()
+        self.walk_structs.clear()
+        if self.struct_cache:
+            self.struct_cache.flush()
+        if self.cache:
+            self.cache.close()
+
+    def open_dump(self, filename):
+        """
+        Opens the given dump file for sequential reading, in binary mode.
+        If we have an uncompressed cache, the cached copy is read instead
+        of decompressing the file again.
+        """
+        if self.cache:
+            return open(self.cache.warm(self.get_dump_path(filename),
+                self.get_cache_name(filename)), 'rb')
+        return lzma.open(self.get_dump_path(filename), 'rb')
+
+    def iter_type(self, obj_type, structures=False, retain=True):
+        """
+        Yields a tuple of the object name and its node, for every object of
+        the given type, as the type's dump file is decompressed.  If
+        `structures` is `True`, the second element of the tuple will be the
+        object's structure (as from `Node.get_structure`) instead.  If
+        `retain` is `False`, the data won't be stored on (or cached for) the
+        nodes in our tree; the nodes yielded will be standalone copies which
+        hold the data, so scanning a large type will run in constant memory
+        so long as the caller doesn't hang on to them.  Objects which have
+        been added to the dump file since our index was generated aren't in
+        our tree, so they always get standalone nodes.  Note that the object
+        type is case-sensitive, and must match the data filename.
+        """
+        with self.open_dump('{}.dump.xz'.format(obj_type)) as df:
+            for (found_type, name, pos_start, raw) in dumps.scan_objects(df):
+                try:
+                    node = self.get_node_by_full_object(name)
+                except KeyError:
+                    node = None
+                if node is None or not retain:
+                    node = Node(re.split('[.:]', name)[-1])
+                    node.has_data = True
+                node.load_from_bytes(raw)
+                if structures:
+                    yield (name, node.get_structure())
+                else:
+                    yield (name, node)
+
+    def get_types(self):
+        """
+        Returns a sorted list of all the object classes in our data.  This
+        comes straight from the index, if it knows about object classes;
+        older indexes don't, in which case we go by our dump filenames.
+        """
+        if self.store.tree.has_classes:
+            return list(self.store.tree.classes)
+        return sorted(set(filename.split('.', 1)[0] for filename in self.store.filenames))
+
+    def get_names_by_type(self, obj_type):
+        """
+        Returns a list of the names of all objects of the given class
+        (case-sensitive), sorted case-insensitively.  This is answered
+        from the index without loading anything, so unlike
+        `get_all_by_type` it also finds objects which live in a dump file
+        named for some other class.  Older indexes don't know about object
+        classes, in which case we fall back to scanning the dump file named
+        after the class.
+        """
+        if self.store.tree.has_classes:
+            return [self.store.get_full_name(node_id) for node_id in self.store.get_class_nodes(obj_type)]
+        try:
+            return sorted((name for (name, node) in self.iter_type(obj_type, retain=False)), key=str.lower)
+        except FileNotFoundError:
+            return []
+
+    def get_referrers(self, name):
+        """
+        Returns a list of the names of all objects which reference the
+        object `name` (case-insensitive), by way of a reference like
+        `BehaviorProviderDefinition'GD_Foo.Bar:BehaviorProviderDefinition_0'`,
+        sorted case-insensitively.  This comes from the index's
+        reverse-reference table, if it has one; otherwise we have to search
+        through every dump file, which is very slow.  Dump files which have
+        changed since the index was generated (see `get_changed_files`)
+        are always searched, rather than trusting the table for them.
+        """
+        if self.store.tree.has_refs:
+            changed = self.get_changed_files()
+            names = [self.store.get_full_name(node_id) for node_id in self.store.get_referrer_nodes(name)
+                    if self.store.filenames[self.store.tree.node_file[node_id]] not in changed]
+            filenames = sorted(changed)
+        else:
+            names = []
+            filenames = self.store.filenames
+        name = name.lower()
+        for filename in filenames:
+            with self.open_dump(filename) as df:
+                for (obj_type, obj_name, pos_start, raw) in dumps.scan_objects(df):
+                    if name in dumps.get_references(raw):
+                        names.append(obj_name)
+        return sorted(set(names), key=str.lower)
+
+    def get_objects_with_property(self, prop, obj_type=None):
+        """
+        Returns a list of the names of all objects which define the
+        top-level property `prop` (case-sensitive; that is, objects whose
+        structure would have `prop` as a key), sorted case-insensitively.
+        If `obj_type` is given, only objects of that class are returned.
+        The base `Object` properties which every object has (`Name`,
+        `Outer`, etc) aren't counted.  This comes from the index's property
+        table, if it has one; otherwise we have to search through the dump
+        files (just the one named after `obj_type`, if that's given), which
+        is slow.  As with `get_referrers`, dump files which have changed
+        since the index was generated are always searched.
+        """
+        if self.store.tree.has_props:
+            changed = self.get_changed_files()
+            node_ids = [node_id for node_id in self.store.get_property_nodes(prop)
+                    if self.store.filenames[self.store.tree.node_file[node_id]] not in changed]
+            if obj_type is not None:
+                class_id = self.store.class_ids.get(obj_type)
+                node_ids = [node_id for node_id in node_ids if self.store.tree.node_class[node_id] == class_id]
+            names = [self.store.get_full_name(node_id) for node_id in node_ids]
+            filenames = sorted(changed)
+        else:
+            names = []
+            if obj_type is None:
+                filenames = self.store.filenames
+            else:
+                filenames = ['{}.dump.xz'.format(obj_type)]
+        for filename in filenames:
+            try:
+                with self.open_dump(filename) as df:
+                    for (found_type, obj_name, pos_start, raw) in dumps.scan_objects(df):
+                        if obj_type is not None and found_type != obj_type:
+                            continue
+                        if prop in dumps.get_property_names(raw):
+                            names.append(obj_name)
+            except FileNotFoundError:
+                pass
+        return sorted(set(names), key=str.lower)
+
+    def extract_columns(self, obj_type, paths, as_frame=False):
+        """
+        Pulls the values at each of the path expressions in `paths` (see
+        `structure.compile_path`; for instance `Prop.Sub` or
+        `Other[*].Field`) out of every object of the given type, reading
+        the type's dump file just once, and only parsing the properties
+        which the paths need.  Returns a dict with the object names in the
+        `name` column, and each path's values in a column named after the
+        path.  Values are typed (see `structure.decode_value`), with object
+        references given as the referenced object names, and `None` where
+        an object doesn't have anything at that path; paths with `[*]` in
+        them give a list of values for each object.  If NumPy is available
+        the columns are NumPy arrays (see `columns.to_array`), and if
+        `as_frame` is `True`, a pandas DataFrame indexed by object name is
+        returned instead (which requires pandas).  As with `iter_type`, the
+        object type is case-sensitive.
+        """
+        compiled = [(path, structure.compile_path(path)) for path in paths]
+        names = []
+        values = {path: [] for path in paths}
+        for (name, node) in self.iter_type(obj_type, retain=False):
+            obj_struct = node.get_structure(lazy=True, typed=True)
+            names.append(name)
+            for (path, steps) in compiled:
+                found = [columns.get_plain_value(value) for (concrete, value) in structure.iter_path(obj_struct, steps)]
+                if None in steps:
+                    values[path].append(found)
+                elif found:
+                    values[path].append(found[0])
                 else:
-                    data.append(line)
+                    values[path].append(None)
+        return columns.make_columns(names, values, as_frame)
 
-        if node:
-            node.load_from_string_list(data)
+    def query(self, obj_type, path, where=None, typed=False, skip_empty=True):
+        """
+        Yields a tuple of the object name, the concrete path (with real
+        array indexes in place of any `[*]`s) and the value, for every
+        value at the path expression `path` (see `structure.compile_path`;
+        for instance `Manufacturers[*].Grades[*].GameStageRequirement.MinGameStage`)
+        in every object of the given type.  `obj_type` can also be a list
+        of types.  The concrete paths are in the same form as the paths
+        used by `set` commands, so the results can be used to generate
+        those directly.
+
+        If `where` is given, it's called with each value, and only the
+        values it returns `True` for are yielded.  `typed` is as in
+        `Node.get_structure`.  If `skip_empty` is `True`, values which are
+        empty or `None` are skipped.  Objects are picked by class, just as
+        in `get_names_by_type` (and so can come from any dump file, if the
+        index knows about classes).  If our index has a property table,
+        only the objects which actually have the path's first property are
+        loaded; otherwise all objects of the class are.  Only the
+        properties the path needs are parsed.  Object types are
+        case-sensitive.
+        """
+        steps = structure.compile_path(path)
+        prop = steps[0]
+        if type(obj_type) == str:
+            obj_types = [obj_type]
+        else:
+            obj_types = obj_type
+        # Properties which aren't in the property table at all might be
+        # base `Object` properties, which aren't indexed
+        use_props = self.store.tree.has_props and bool(self.store.get_property_nodes(prop))
+        for cur_type in obj_types:
+            if use_props:
+                nodes = self.iter_load_many(self.get_objects_with_property(prop, cur_type))
+            elif self.store.tree.has_classes:
+                nodes = self.iter_load_many(self.get_names_by_type(cur_type))
+            elif '{}.dump.xz'.format(cur_type) in self.store.filenames:
+                # Without classes, `get_names_by_type` goes by the dump
+                # file named after the class, so we can just stream that
+                nodes = self.iter_type(cur_type, retain=False)
+            else:
+                nodes = []
+            for (name, node) in nodes:
+                obj_struct = node.get_structure(lazy=True, typed=typed)
+                for (concrete, value) in structure.iter_path(obj_struct, steps):
+                    if skip_empty and (value is None or value == '' or value == 'None'):
+                        continue
+                    if where is None or where(value):
+                        yield (name, concrete, value)
+
+    def get_walk_refs(self, obj_struct, follow):
+        """
+        Yields a tuple of the concrete path and the referenced object name,
+        for every object reference found at the compiled paths in `follow`
+        inside `obj_struct` (see `walk`).  References can be either
+        `structure.ObjectRef`s or strings; paths which end up at a list
+        (or a string holding a bare list of references) have each of the
+        list's elements checked.
+        """
+        for steps in follow:
+            for (path, value) in structure.iter_path(obj_struct, steps):
+                if type(value) == list:
+                    values = [('{}[{}]'.format(path, idx), inner) for (idx, inner) in enumerate(value)]
+                else:
+                    values = [(path, value)]
+                for (path, value) in values:
+                    if type(value) == structure.ObjectRef:
+                        yield (path, value.name)
+                    elif type(value) == str and "'" in value:
+                        refs = structure.object_ref_re.findall(value)
+                        if len(refs) == 1:
+                            yield (path, refs[0][1])
+                        else:
+                            for (idx, (obj_type, name)) in enumerate(refs):
+                                yield ('{}[{}]'.format(path, idx), name)
+
+    def load_walk_structs(self, names, typed):
+        """
+        Returns a dict of lowercased object names to structures, for all
+        the objects in `names` which can actually be found.  Structures are
+        taken from our walk memo (see `walk`) where possible, and the rest
+        are loaded in a single pass through the data (see
+        `iter_load_many`), and added to the memo.  The memo only holds on
+        to the `max_walk_structs` most recently used structures.
+        """
+        structs = {}
+        to_load = []
+        for name in names:
+            key = (name.lower(), typed)
+            if key[0] in structs:
+                continue
+            if key in self.walk_structs:
+                self.walk_structs.move_to_end(key)
+                structs[key[0]] = self.walk_structs[key]
+                continue
+            try:
+                self.get_node_by_full_object(name)
+            except KeyError:
+                continue
+            structs[key[0]] = None
+            to_load.append(name)
+        for (name, node) in self.iter_load_many(to_load):
+            obj_struct = node.get_structure(typed=typed)
+            structs[name.lower()] = obj_struct
+            self.walk_structs[(name.lower(), typed)] = obj_struct
+        while len(self.walk_structs) > self.max_walk_structs:
+            self.walk_structs.popitem(last=False)
+        return structs
+
+    def walk(self, start, follow, max_depth=None, visit=None, depth_first=False, typed=False):
+        """
+        Walks through the graph of object references, starting at the
+        object named `start` (or each of the objects in `start`, if it's a
+        list), following the references found at each of the path
+        expressions in `follow` (see `structure.compile_path`), such as
+        `ActorArchetypeList[*].SpawnFactory`.  Yields a tuple of the object
+        name, its structure, its depth (the starting objects are at zero),
+        the name of the object we got to it from, and the concrete path of
+        the reference in that object (both `None` for the starting
+        objects), for every object we reach.
+
+        Each object is only visited once, so reference cycles are fine.
+        References to objects which aren't in our data are skipped.  If
+        `max_depth` is given, we won't follow references out of objects at
+        that depth.  If `visit` is given, it's called with the object name,
+        structure and depth for each object we reach, before it's yielded;
+        if it returns `False`, references out of that object won't be
+        followed.  By default the walk is breadth-first, so objects are
+        reached by their shortest path; pass `depth_first=True` for a
+        depth-first walk instead, which visits objects in preorder (each
+        object's references, in the order they're found, are walked all
+        the way down before moving on to the next one).  `typed` is as in
+        `Node.get_structure`.
+
+        Recently-used structures are kept in `walk_structs`, which is
+        shared between all our walks, so walking through the same objects
+        again is cheap (this also means that callers shouldn't modify the
+        structures they get).  Rather than loading objects one at a time,
+        each batch of newly found references (the whole next level, when
+        breadth-first, or all of an object's references, when depth-first)
+        is loaded in a single pass through the data, grouped by dump file.
+        """
+        compiled = [structure.compile_path(path) for path in follow]
+        if type(start) == str:
+            start = [start]
+        structs = self.load_walk_structs(start, typed)
+
+        # Breadth-first walks mark objects as seen as soon as they're
+        # found, so each is only queued once.  Depth-first walks have to
+        # wait until they're actually visited, or objects would end up
+        # visited from wherever they were first found, rather than from
+        # wherever the walk first gets down to them.
+        seen = set()
+        pending = []
+        for name in start:
+            if name.lower() in structs and name.lower() not in seen:
+                if not depth_first:
+                    seen.add(name.lower())
+                pending.append((name, structs[name.lower()], 0, None, None))
+        if depth_first:
+            pending.reverse()
+
+        while pending:
+            if depth_first:
+                batch = [pending.pop()]
+                if batch[0][0].lower() in seen:
+                    continue
+                seen.add(batch[0][0].lower())
+            else:
+                batch = pending
+                pending = []
+            found = []
+            for (name, obj_struct, depth, parent, path) in batch:
+                follow_refs = max_depth is None or depth < max_depth
+                if visit is not None and visit(name, obj_struct, depth) is False:
+                    follow_refs = False
+                yield (name, obj_struct, depth, parent, path)
+                if follow_refs:
+                    for (ref_path, ref_name) in self.get_walk_refs(obj_struct, compiled):
+                        if ref_name.lower() not in seen:
+                            if not depth_first:
+                                seen.add(ref_name.lower())
+                            found.append((ref_name, depth+1, name, ref_path))
+            if found:
+                structs = self.load_walk_structs([ref[0] for ref in found], typed)
+                found = [(ref_name, structs[ref_name.lower()], depth, parent, path)
+                        for (ref_name, depth, parent, path) in found
+                        if ref_name.lower() in structs]
+                if depth_first:
+                    pending.extend(reversed(found))
+                else:
+                    pending = found
 
-        return objects
+    def get_all_by_type(self, obj_type):
+        """
+        Returns a list of the names of all objects of the given type,
+        loading the data for all of them along the way (see `iter_type`,
+        which is a better choice when there are a lot of objects).  Note
+        that the object type is case-sensitive, and must match the data
+        filename.
+        """
+        return [name for (name, node) in self.iter_type(obj_type)]
 
     def get_node_paths_by_full_object(self, name):
         """
@@ -662,11 +1693,69 @@ class Data(object):
         # Return the list
         return paths
 
-    def get_struct_by_full_object(self, name):
+    def get_struct_by_full_object(self, name, lazy=False, typed=False):
+        """
+        Retrieves a node's structure by the full object name.  `lazy` and
+        `typed` are as in `Node.get_structure`.
+        """
+        return self.get_node_by_full_object(name).get_structure(lazy=lazy, typed=typed)
+
+    def iter_load_many(self, names, workers=1):
+        """
+        Loads all the objects named in `names`, yielding a tuple of the
+        object name and its node as each one is loaded (the node's data will
+        be loaded, at least until it gets evicted from our cache).  Rather
+        than loading each object separately, requests are grouped by dump
+        file and sorted by position, so each file is read in a single
+        forward pass.  If `workers` is more than one, that many files are
+        read in parallel, in which case objects from different files may be
+        yielded in any order.  Raises `KeyError` (before loading anything)
+        if any of the names can't be found.
+        """
+        by_file = {}
+        for name in names:
+            node = self.get_node_by_full_object(name)
+            by_file.setdefault(node.filename, {})[name] = node
+
+        def load_file(file_nodes):
+            results = []
+            for (name, node) in sorted(file_nodes.items(), key=lambda item: item[1].pos_start):
+                node.load()
+                results.append((name, node))
+            return results
+
+        if workers > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(load_file, file_nodes) for file_nodes in by_file.values()]
+                for future in concurrent.futures.as_completed(futures):
+                    yield from future.result()
+        else:
+            for file_nodes in by_file.values():
+                yield from load_file(file_nodes)
+
+    def load_many(self, names, workers=1):
+        """
+        Loads all the objects named in `names` in as few passes through the
+        data as possible (see `iter_load_many`).  Returns a dict whose keys
+        are the object names and whose values are the objects' data (as a
+        list of lines).
+        """
+        return {name: node.load() for (name, node) in self.iter_load_many(names, workers=workers)}
+
+    def iter_structs(self, names, workers=1):
+        """
+        Like `iter_load_many`, but yields tuples of the object name and its
+        structure.
+        """
+        for (name, node) in self.iter_load_many(names, workers=workers):
+            yield (name, node.get_structure())
+
+    def get_structs(self, names, workers=1):
         """
-        Retrieves a node's structure by the full object name.
+        Like `load_many`, but returns a dict of object names to their
+        structures.
         """
-        return self.get_node_by_full_object(name).get_structure()
+        return dict(self.iter_structs(names, workers=workers))
 
     def get_node_by_full_object(self, name):
         """
@@ -682,7 +1771,7 @@ class Data(object):
         level_packages = ['{}:PersistentLevel'.format(main_name)]
         main_node = self.get_node_by_full_object(main_name)
         for child in main_node.get_children_with_name('levelstreaming'):
-            childstruct = child.get_structure()
+            childstruct = child.get_structure(lazy=True)
             if childstruct['LoadedLevel'] != 'None':
                 level_packages.append(childstruct['LoadedLevel'].split("'", 2)[1])
         return level_packages
@@ -714,6 +1803,8 @@ class Data(object):
 
     @staticmethod
     def get_attr_obj(name):
+        if type(name) == structure.ObjectRef:
+            return name.name
         if "'" in name:
             return name.split("'", 2)[1]
         else:
@@ -722,7 +1813,7 @@ class Data(object):
     @staticmethod
     def get_struct_attr_obj(node_struct, name):
         if name in node_struct:
-            if node_struct[name] != 'None':
+            if node_struct[name] is not None and node_struct[name] != 'None':
                 return Data.get_attr_obj(node_struct[name])
         return None
 
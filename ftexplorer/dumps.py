@@ -0,0 +1,625 @@
+#!/usr/bin/env python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+
+# Copyright (c) 2018-2021, CJ Kucera
+# All rights reserved.
+#   
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import io
+import os
+import re
+import json
+import mmap
+import time
+import lzma
+import shutil
+import struct
+import hashlib
+import threading
+import collections
+
+# Helpers for dealing with our compressed dump files directly.
+#
+# Our dumps are plain xz files, which are great for size but terrible for
+# random access: seeking to an object in the middle of a file means
+# decompressing everything before it.  To get around that, dumps can be
+# rewritten (with `convert_dumps.py`) as a series of concatenated xz
+# *streams*, each of which holds one or more complete objects.  That's
+# still a perfectly valid xz file as far as `xz` and `lzma.open` are
+# concerned, but because every stream is independently decompressible, we
+# can jump straight to the one we want.  The xz format stores enough
+# information in each stream's footer+index that we can find all the
+# stream boundaries without any sidecar file, by walking backwards from
+# the end of the file.
+#
+# Throughout here we refer to each of those streams as a "block."  A block
+# table is a list of tuples of the form:
+#
+#   (compressed start, compressed length, uncompressed start, uncompressed length)
+
+xz_header_magic = b'\xfd7zXZ\x00'
+xz_footer_magic = b'YZ'
+
+# Default (uncompressed) size that `write_blocked_dump` aims for, per block.
+default_block_size = 64*1024
+
+# Matches the header line of an object in a dump
+header_re = re.compile(rb"Property dump for object '\S+ (\S+)' ")
+
+# The start of the header line for each object in a dump, and a regex to
+# pull the object's type and name out of it (use with `match`)
+object_header = b"*** Property dump for object '"
+object_start_re = re.compile(rb"\*\*\* Property dump for object '(\S+) (\S+)' ")
+
+# Matches a reference to another object inside a dump, such as
+# `BehaviorProviderDefinition'GD_Foo.Bar:BehaviorProviderDefinition_0'`
+reference_re = re.compile(rb"[A-Za-z0-9_]+'([^'\s]+)'")
+
+# Matches the name of a top-level property inside a dump (the same lines
+# which `Node.get_structure` picks up), and the header of the section
+# holding the base `Object` properties which every object has
+property_re = re.compile(rb'^\s*([A-Za-z0-9_]+)(?:\(\d+\))?=', re.M)
+object_properties_header = b'\n=== Object properties ==='
+
+# Amount of uncompressed data that `scan_objects` reads at a time
+scan_chunk_size = 1024*1024
+
+def _read_varint(buf, pos):
+    """
+    Reads an xz-style multibyte integer from `buf` at `pos`.  Returns a
+    tuple of the value and the position just past it.
+    """
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(buf) or shift > 63:
+            raise ValueError('Invalid xz multibyte integer')
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80 == 0:
+            return (value, pos)
+        shift += 7
+
+def get_block_table(filename):
+    """
+    Returns the block table for the given xz file, by walking the stream
+    footers backwards from the end of the file.  A "normal" xz file will
+    just have a single block.  Raises `ValueError` if the file can't be
+    parsed as xz.
+    """
+    streams = []
+    with open(filename, 'rb') as df:
+        df.seek(0, io.SEEK_END)
+        pos = df.tell()
+        while pos > 0:
+
+            # Skip over any stream padding
+            while pos >= 4:
+                df.seek(pos-4)
+                if df.read(4) != b'\x00\x00\x00\x00':
+                    break
+                pos -= 4
+
+            # Read the stream footer
+            if pos < 24:
+                raise ValueError('Truncated xz stream in {}'.format(filename))
+            df.seek(pos-12)
+            footer = df.read(12)
+            if footer[10:] != xz_footer_magic:
+                raise ValueError('Invalid xz stream footer in {}'.format(filename))
+            index_size = (struct.unpack('<I', footer[4:8])[0]+1)*4
+            index_start = pos - 12 - index_size
+            if index_start < 12:
+                raise ValueError('Invalid xz index size in {}'.format(filename))
+
+            # Read the index, to figure out how large the blocks are
+            df.seek(index_start)
+            index = df.read(index_size)
+            if index[0] != 0:
+                raise ValueError('Invalid xz index in {}'.format(filename))
+            (records, idx) = _read_varint(index, 1)
+            compressed = 0
+            uncompressed = 0
+            for _ in range(records):
+                (unpadded, idx) = _read_varint(index, idx)
+                (size, idx) = _read_varint(index, idx)
+                compressed += (unpadded+3) & ~3
+                uncompressed += size
+
+            # ... and from there, where the stream starts
+            stream_start = index_start - compressed - 12
+            if stream_start < 0:
+                raise ValueError('Invalid xz stream sizes in {}'.format(filename))
+            df.seek(stream_start)
+            if df.read(6) != xz_header_magic:
+                raise ValueError('Invalid xz stream header in {}'.format(filename))
+            streams.append((stream_start, pos-stream_start, uncompressed))
+            pos = stream_start
+
+    # Now put them in order and figure out the uncompressed positions
+    table = []
+    uncompressed_start = 0
+    for (start, length, uncompressed) in reversed(streams):
+        table.append((start, length, uncompressed_start, uncompressed))
+        uncompressed_start += uncompressed
+    return table
+
+def read_block(filename, block):
+    """
+    Reads and decompresses a single block (as specified by a block table
+    entry, or at least the first two elements of one) from the given
+    file.  Returns the uncompressed bytes.
+    """
+    with open(filename, 'rb') as df:
+        df.seek(block[0])
+        return lzma.decompress(df.read(block[1]), format=lzma.FORMAT_XZ)
+
+def file_hash(filename):
+    """
+    Returns a hex digest of the contents of the given file.  This is the
+    hash we use anywhere we need to know if a dump file has changed.
+    """
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as df:
+        for chunk in iter(lambda: df.read(1024*1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def scan_objects(df, chunk_size=scan_chunk_size):
+    """
+    Given a dump file opened in binary mode (either an `lzma.open` handle
+    or an uncompressed file), yields a tuple of the object type, object
+    name, uncompressed start position, and the raw bytes of the object, for
+    each object in the file, in order.  The file is read in `chunk_size`
+    chunks, and object headers are found by searching the raw data rather
+    than by going line-by-line, so positions are just computed from how
+    far into the file we are.  Only one object's data (plus one chunk) is
+    held at a time.  Anything in front of the first object is skipped.
+    """
+    # We search for headers with the newline in front of them, so they're
+    # anchored to the start of a line; start off with a fake newline so
+    # that an object at the very start of the file can be found.
+    marker = b'\n' + object_header
+    buf = bytearray(b'\n')
+    buf_pos = -1
+    search_from = 0
+    cur_obj = None
+    while True:
+        chunk = df.read(chunk_size)
+        buf.extend(chunk)
+        while True:
+            found = buf.find(marker, search_from)
+            if found < 0:
+                search_from = max(0, len(buf) - len(marker) + 1)
+                if cur_obj is None and search_from > 0:
+                    del buf[:search_from]
+                    buf_pos += search_from
+                    search_from = 0
+                break
+            header_start = found + 1
+            if chunk and buf.find(b'\n', header_start) < 0:
+                # Wait until we have the whole header line
+                search_from = found
+                break
+            search_from = header_start
+            match = object_start_re.match(buf, header_start)
+            if not match:
+                continue
+            if cur_obj is not None:
+                yield (cur_obj[0], cur_obj[1], buf_pos, bytes(buf[:header_start]))
+            cur_obj = (match.group(1).decode('latin1'), match.group(2).decode('latin1'))
+            del buf[:header_start]
+            buf_pos += header_start
+            search_from = 0
+        if not chunk:
+            break
+    if cur_obj is not None:
+        yield (cur_obj[0], cur_obj[1], buf_pos, bytes(buf))
+
+def get_references(raw):
+    """
+    Returns a set of the names of all the objects referenced by the given
+    raw object data (as yielded by `scan_objects`), lowercased.  The
+    object's own header line is skipped.
+    """
+    return set(name.decode('latin1').lower()
+            for name in reference_re.findall(raw, raw.find(b'\n') + 1))
+
+def get_property_names(raw):
+    """
+    Returns a set of the names of the top-level properties defined in the
+    given raw object data (as yielded by `scan_objects`), which are the
+    keys that `Node.get_structure` would return.  The base `Object`
+    properties (`Name`, `Outer`, etc), which every object has, are left
+    out.
+    """
+    end = raw.find(object_properties_header)
+    if end == -1:
+        end = len(raw)
+    return set(name.decode('latin1') for name in property_re.findall(raw, 0, end))
+
+def write_blocked_dump(source, dest, block_size=default_block_size):
+    """
+    Writes out the dump `source` to `dest` as a series of concatenated xz
+    streams, each of which contains complete objects and is at least
+    `block_size` bytes long (uncompressed), unless we hit the end of the
+    file.  Objects are never split between blocks, so a single large
+    object may end up with a block all to itself.  `source` and `dest`
+    must not be the same file.  Returns the number of blocks written.
+    """
+    blocks = 0
+    with lzma.open(source, 'rb') as df, open(dest, 'wb') as odf:
+        cur_block = []
+        cur_size = 0
+        for line in df:
+            if cur_size >= block_size and header_re.search(line):
+                odf.write(lzma.compress(b''.join(cur_block), format=lzma.FORMAT_XZ))
+                blocks += 1
+                cur_block = []
+                cur_size = 0
+            cur_block.append(line)
+            cur_size += len(line)
+        if cur_block or blocks == 0:
+            odf.write(lzma.compress(b''.join(cur_block), format=lzma.FORMAT_XZ))
+            blocks += 1
+    return blocks
+
+class DumpReader(object):
+    """
+    Reads raw object data out of dump files, keeping a small pool of open
+    decompressor handles around so that reading objects in file order only
+    decompresses each file once.  Seeking forward in an lzma stream is
+    cheap (it just decompresses what's in between), but seeking backwards
+    means starting over from the beginning, so when handing out a handle
+    we pick the one which is furthest along without having gone past the
+    object we want.  Handles which haven't been used in `idle_timeout`
+    seconds are closed.  We also hang on to the last few blocks we've
+    decompressed from block-compressed files, since neighbouring objects
+    tend to get loaded together.
+
+    This is safe to use from multiple threads; each handle is only ever
+    used by one thread at a time.
+    """
+
+    def __init__(self, max_handles=4, idle_timeout=30, max_blocks=8):
+        self.max_handles = max_handles
+        self.idle_timeout = idle_timeout
+        self.max_blocks = max_blocks
+        self.lock = threading.Lock()
+        self.handles = {}
+        self.blocks = collections.OrderedDict()
+        self.timer = None
+
+    def read(self, filename, pos_start, length):
+        """
+        Reads `length` uncompressed bytes from `filename`, starting at
+        `pos_start`.
+        """
+        df = self._checkout(filename, pos_start)
+        try:
+            df.seek(pos_start)
+            data = df.read(length)
+        except (lzma.LZMAError, EOFError, OSError):
+            df.close()
+            raise
+        self._checkin(filename, df)
+        return data
+
+    def read_block(self, filename, block):
+        """
+        Returns the decompressed contents of the given block (a block table
+        entry) from `filename`.
+        """
+        key = (filename, block[0])
+        with self.lock:
+            if key in self.blocks:
+                self.blocks.move_to_end(key)
+                return self.blocks[key]
+        data = read_block(filename, block)
+        with self.lock:
+            self.blocks[key] = data
+            while len(self.blocks) > self.max_blocks:
+                self.blocks.popitem(last=False)
+        return data
+
+    def _checkout(self, filename, pos_start):
+        """
+        Returns an open handle for `filename` which is positioned at or
+        before `pos_start`, opening a new one if we don't have one.  The
+        handle is removed from the pool until it's checked back in.
+        """
+        with self.lock:
+            best = None
+            for (idx, (df, last_used)) in enumerate(self.handles.get(filename, [])):
+                pos = df.tell()
+                if pos <= pos_start and (best is None or pos > best[1]):
+                    best = (idx, pos)
+            if best is not None:
+                return self.handles[filename].pop(best[0])[0]
+        return lzma.open(filename, 'rb')
+
+    def _checkin(self, filename, df):
+        """
+        Returns a handle to the pool.  If we've got too many handles open
+        for this file, the least recently used one is closed.
+        """
+        with self.lock:
+            if filename not in self.handles:
+                self.handles[filename] = []
+            pool = self.handles[filename]
+            pool.append((df, time.monotonic()))
+            while len(pool) > self.max_handles:
+                pool.pop(0)[0].close()
+            if self.timer is None:
+                self.timer = threading.Timer(self.idle_timeout, self._reap)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _reap(self):
+        """
+        Closes any handles which have been idle for longer than our
+        timeout.  Reschedules itself if there are any handles left.
+        """
+        self.close_idle(self.idle_timeout)
+        with self.lock:
+            self.timer = None
+            if any(self.handles.values()):
+                self.timer = threading.Timer(self.idle_timeout, self._reap)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def close_idle(self, max_idle=0):
+        """
+        Closes any handles which have been idle for at least `max_idle`
+        seconds (by default, all of them).
+        """
+        cutoff = time.monotonic() - max_idle
+        to_close = []
+        with self.lock:
+            for (filename, pool) in list(self.handles.items()):
+                to_close.extend(df for (df, last_used) in pool if last_used <= cutoff)
+                pool[:] = [(df, last_used) for (df, last_used) in pool if last_used > cutoff]
+                if not pool:
+                    del self.handles[filename]
+        for df in to_close:
+            df.close()
+
+    def close(self):
+        """
+        Closes all our handles and forgets any cached blocks.
+        """
+        self.close_idle()
+        with self.lock:
+            self.blocks.clear()
+
+class DumpCache(object):
+    """
+    An on-disk cache of uncompressed dump files.  The first time a dump
+    file is requested, it gets decompressed into `cache_dir`, and from
+    then on objects can be served straight out of an `mmap` of the
+    uncompressed file.  Alongside each cached file is a small `.meta`
+    JSON file recording the size, mtime and hash of the source file it
+    was decompressed from; if the source's size or mtime change we'll
+    check the hash, and re-decompress if that's changed too.
+
+    If `max_size` (in bytes) is given, the least-recently-used cache files
+    are deleted whenever we add a new one and the total size of the cache
+    goes over that limit.  Files which we currently have mapped are never
+    evicted.  Usage is tracked per-file, in the `.meta` files, and is only
+    updated when a file is first mapped.  The sizes and usage times of
+    all the cached files are read in the first time we need them, and
+    kept up to date in memory from then on.
+
+    Each cache file has its own lock, which is held while it's being
+    checked, decompressed or mapped, so that threads can work on different
+    files at the same time.
+    """
+
+    def __init__(self, cache_dir, max_size=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.maps = {}
+        self.file_locks = {}
+        self.usage = None
+
+    def get_cache_path(self, cache_name):
+        """
+        Returns the path to the uncompressed file for `cache_name`, which
+        is a relative path like `BL2/Foo.dump`.
+        """
+        return os.path.join(self.cache_dir, cache_name)
+
+    def get_file_lock(self, cache_name):
+        """
+        Returns the lock for the cache file `cache_name`
+        """
+        with self.lock:
+            file_lock = self.file_locks.get(cache_name)
+            if file_lock is None:
+                file_lock = self.file_locks[cache_name] = threading.RLock()
+            return file_lock
+
+    def get_usage(self):
+        """
+        Returns a dict of the names of all our cache files to tuples of
+        when they were last used and their size, reading through all the
+        `.meta` files to find out the first time we're called.  The caller
+        should be holding our lock.
+        """
+        if self.usage is None:
+            self.usage = {}
+            for (dirpath, dirnames, filenames) in os.walk(self.cache_dir):
+                for filename in filenames:
+                    if not filename.endswith('.meta'):
+                        continue
+                    meta_path = os.path.join(dirpath, filename)
+                    cache_path = meta_path[:-5]
+                    try:
+                        size = os.path.getsize(cache_path)
+                        with open(meta_path) as df:
+                            last_used = json.load(df).get('last_used', 0)
+                    except (OSError, ValueError):
+                        continue
+                    self.usage[os.path.relpath(cache_path, self.cache_dir)] = (last_used, size)
+        return self.usage
+
+    def get(self, source, cache_name):
+        """
+        Returns an `mmap` (or, for empty files, an empty bytes object) of
+        the uncompressed contents of `source`, decompressing it into the
+        cache under `cache_name` if need be.  Only the file's own lock is
+        held while that happens.
+        """
+        mapped = self.maps.get(cache_name)
+        if mapped is not None:
+            return mapped
+        with self.get_file_lock(cache_name):
+            if cache_name in self.maps:
+                return self.maps[cache_name]
+            cache_path = self.warm(source, cache_name)
+            with open(cache_path, 'rb') as df:
+                if os.fstat(df.fileno()).st_size == 0:
+                    mapped = b''
+                else:
+                    mapped = mmap.mmap(df.fileno(), 0, access=mmap.ACCESS_READ)
+            with self.lock:
+                self.maps[cache_name] = mapped
+            return mapped
+
+    def read(self, source, cache_name, pos_start, length):
+        """
+        Returns a (zero-copy) memoryview of `length` uncompressed bytes
+        from `source`, starting at `pos_start`.
+        """
+        return memoryview(self.get(source, cache_name))[pos_start:pos_start+length]
+
+    def warm(self, source, cache_name):
+        """
+        Makes sure that we have a valid uncompressed copy of `source` in the
+        cache.  Returns the path to the uncompressed file.
+        """
+        cache_path = self.get_cache_path(cache_name)
+        meta_path = '{}.meta'.format(cache_path)
+        with self.get_file_lock(cache_name):
+            stat = os.stat(source)
+            meta = None
+            if os.path.exists(cache_path):
+                try:
+                    with open(meta_path) as df:
+                        meta = json.load(df)
+                except (OSError, ValueError):
+                    meta = None
+
+            # See if our cached copy is still valid.  Size+mtime is good
+            # enough if they match; otherwise fall back to the hash.
+            valid = False
+            if meta is not None:
+                if meta['source_size'] == stat.st_size and meta['source_mtime_ns'] == stat.st_mtime_ns:
+                    valid = True
+                elif meta['source_size'] == stat.st_size and meta['source_hash'] == file_hash(source):
+                    valid = True
+
+            # Decompress, if need be
+            if not valid:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                temp_path = '{}.new'.format(cache_path)
+                with lzma.open(source, 'rb') as df, open(temp_path, 'wb') as odf:
+                    shutil.copyfileobj(df, odf, 1024*1024)
+                os.replace(temp_path, cache_path)
+                meta = {'source_hash': file_hash(source)}
+
+            # Write out our updated metadata
+            meta['source_size'] = stat.st_size
+            meta['source_mtime_ns'] = stat.st_mtime_ns
+            meta['last_used'] = time.time()
+            with open(meta_path, 'w') as df:
+                json.dump(meta, df)
+            if self.max_size is not None:
+                size = os.path.getsize(cache_path)
+                with self.lock:
+                    self.get_usage()[cache_name] = (meta['last_used'], size)
+
+        if not valid:
+            self.evict(keep=cache_name)
+        return cache_path
+
+    def evict(self, keep=None):
+        """
+        Deletes least-recently-used files from the cache until we're under
+        our size limit.  The file `keep`, any file we have mapped, and any
+        file another thread is busy with won't be touched, and neither will
+        any file we can't delete.
+        """
+        if self.max_size is None:
+            return
+        with self.lock:
+            usage = self.get_usage()
+            total = sum(size for (last_used, size) in usage.values())
+            entries = sorted((last_used, size, cache_name)
+                    for (cache_name, (last_used, size)) in usage.items()
+                    if cache_name != keep and cache_name not in self.maps)
+        for (last_used, size, cache_name) in entries:
+            if total <= self.max_size:
+                break
+            file_lock = self.get_file_lock(cache_name)
+            if not file_lock.acquire(blocking=False):
+                continue
+            try:
+                with self.lock:
+                    if cache_name in self.maps or usage.pop(cache_name, None) is None:
+                        continue
+                cache_path = self.get_cache_path(cache_name)
+                try:
+                    os.remove(cache_path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    # Still there, so keep counting it
+                    with self.lock:
+                        usage.setdefault(cache_name, (last_used, size))
+                    continue
+                try:
+                    os.remove('{}.meta'.format(cache_path))
+                except OSError:
+                    pass
+            finally:
+                file_lock.release()
+            total -= size
+
+    def close(self):
+        """
+        Unmaps all our files
+        """
+        with self.lock:
+            for mapped in self.maps.values():
+                if isinstance(mapped, mmap.mmap):
+                    try:
+                        mapped.close()
+                    except BufferError:
+                        # Someone's still holding a view into it; it'll get
+                        # unmapped once that's gone.
+                        pass
+            self.maps = {}
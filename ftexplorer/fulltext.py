@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+
+# Copyright (c) 2018-2021, CJ Kucera
+# All rights reserved.
+#   
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import array
+import bisect
+from . import packed
+
+# An optional full-text index of the dump data, which `search.py` can use to
+# avoid reading through every dump file for every search.  This is built by
+# `generate_indexes.py --full-text`, and stored in `index.text.bin` alongside
+# the main index, as a packed file (see `packed.py`).
+#
+# Every object in every dump file (including objects which don't make it
+# into the main index, like duplicates) is a "document," numbered in the
+# order we find them, going through the dump files in sorted order.  For
+# each trigram (three-byte sequence) in the lowercased text of an object,
+# we store a "posting list" of the documents it appears in.  Searching for
+# a string then means intersecting the posting lists of all its trigrams to
+# get a (hopefully short) list of candidates, which still need to be checked
+# against the actual text.  Trigrams which span lines aren't indexed, so
+# this only works for search strings without newlines.
+#
+# Trigrams which show up in a large fraction of all objects (the trigrams in
+# common property names, for instance) wouldn't narrow anything down, and
+# would make the index much bigger, so those are "stopped": we remember that
+# we've seen them, but not where.  Searches just skip over them.  Lowercasing
+# is only done for ASCII characters, so trigrams in a search string which
+# include any non-ASCII characters are skipped too, since the text could
+# have them in a different case.
+#
+# The sections are:
+#
+#   `files`: String table of dump filenames
+#   `classes`: String table of object classes
+#   `doc_file`, `doc_pos`, `doc_length`, `doc_class`: File ID, uncompressed
+#      start position, length and class ID for each document
+#   `doc_names`: String table of the object name of each document
+#   `trigrams`: Sorted list of the indexed trigrams, as integers
+#   `posting_first`: For each trigram, the position of its posting list in
+#      `postings`, plus a final entry for the total length
+#   `postings`: The posting lists, as varint-encoded deltas between
+#      document IDs
+#   `stopped`: Sorted list of the trigrams which were seen too often to index
+
+text_index_name = 'index.text.bin'
+
+# Trigrams found in more than this fraction of all objects get stopped.
+default_max_fraction = 0.05
+
+def get_trigrams(raw, line_cache=None):
+    """
+    Returns a set of the trigrams (as integers) found in the given raw
+    text, after lowercasing it.  `line_cache` can be a dict which is
+    passed in each time we're called, to avoid re-computing the trigrams
+    for lines we've already seen.
+    """
+    trigrams = set()
+    for line in set(raw.lower().split(b'\n')):
+        line_trigrams = None
+        if line_cache is not None:
+            line_trigrams = line_cache.get(line)
+        if line_trigrams is None:
+            line_trigrams = frozenset([int.from_bytes(line[idx:idx+3], 'big')
+                for idx in range(len(line)-2)])
+            if line_cache is not None:
+                line_cache[line] = line_trigrams
+        trigrams |= line_trigrams
+    return trigrams
+
+def encode_postings(doc_ids, out):
+    """
+    Appends the varint-encoded deltas of the (sorted) `doc_ids` to the
+    bytearray `out`.
+    """
+    prev = 0
+    for doc_id in doc_ids:
+        delta = doc_id - prev
+        prev = doc_id
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+
+def decode_postings(data):
+    """
+    Returns the list of document IDs encoded in `data`
+    """
+    doc_ids = []
+    doc_id = 0
+    delta = 0
+    shift = 0
+    for byte in data:
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            doc_id += delta
+            doc_ids.append(doc_id)
+            delta = 0
+            shift = 0
+    return doc_ids
+
+class TextIndexBuilder(object):
+    """
+    Builds up a full-text index, one dump file at a time.  Any trigram
+    found in more than `max_docs` objects is stopped.  Since we drop a
+    trigram's postings as soon as it goes over that limit, the limit has
+    to be known up front (`generate_indexes.py` knows how many objects
+    there are from its main scan).
+    """
+
+    def __init__(self, max_docs):
+        self.max_docs = max_docs
+        self.files = []
+        self.classes = []
+        self.class_ids = {}
+        self.doc_file = array.array('I')
+        self.doc_pos = array.array('I')
+        self.doc_length = array.array('I')
+        self.doc_class = array.array('I')
+        self.doc_names = []
+        self.postings = {}
+        self.stopped = set()
+
+    def add_file(self, filename, objects, postings):
+        """
+        Adds the dump file `filename` to the index.  `objects` is a list of
+        tuples of class, name, start position and length for every object
+        in the file, and `postings` is a dict of trigrams to arrays of
+        indexes into `objects`.
+        """
+        file_id = len(self.files)
+        first_doc = len(self.doc_names)
+        self.files.append(filename)
+        for (obj_class, obj_name, pos_start, length) in objects:
+            if obj_class not in self.class_ids:
+                self.class_ids[obj_class] = len(self.classes)
+                self.classes.append(obj_class)
+            self.doc_file.append(file_id)
+            self.doc_pos.append(pos_start)
+            self.doc_length.append(length)
+            self.doc_class.append(self.class_ids[obj_class])
+            self.doc_names.append(obj_name)
+        for (trigram, doc_ids) in postings.items():
+            if trigram in self.stopped:
+                continue
+            if trigram not in self.postings:
+                self.postings[trigram] = array.array('I')
+            trigram_postings = self.postings[trigram]
+            trigram_postings.extend(doc_id + first_doc for doc_id in doc_ids)
+            if len(trigram_postings) > self.max_docs:
+                self.stopped.add(trigram)
+                del self.postings[trigram]
+
+    def write(self, filename):
+        """
+        Writes out the index to `filename`
+        """
+        trigrams = array.array('I', sorted(self.postings.keys()))
+        posting_first = array.array('Q')
+        postings = bytearray()
+        for trigram in trigrams:
+            posting_first.append(len(postings))
+            encode_postings(self.postings[trigram], postings)
+        posting_first.append(len(postings))
+        packed.write_packed(filename, {
+            'files': self.files,
+            'classes': self.classes,
+            'doc_file': self.doc_file,
+            'doc_pos': self.doc_pos,
+            'doc_length': self.doc_length,
+            'doc_class': self.doc_class,
+            'doc_names': self.doc_names,
+            'trigrams': trigrams,
+            'posting_first': posting_first,
+            'postings': array.array('B', postings),
+            'stopped': array.array('I', sorted(self.stopped)),
+            })
+
+class TextIndex(object):
+    """
+    A full-text index, opened for reading
+    """
+
+    def __init__(self, filename):
+        self.packed = packed.PackedFile(filename)
+        self.files = self.packed.strings('files')
+        self.classes = self.packed.strings('classes')
+        self.doc_file = self.packed.array('doc_file')
+        self.doc_pos = self.packed.array('doc_pos')
+        self.doc_length = self.packed.array('doc_length')
+        self.doc_class = self.packed.array('doc_class')
+        self.doc_names = self.packed.strings('doc_names')
+        self.trigrams = self.packed.array('trigrams')
+        self.posting_first = self.packed.array('posting_first')
+        self.postings = self.packed.array('postings')
+        self.stopped = self.packed.array('stopped')
+
+    def __len__(self):
+        return len(self.doc_file)
+
+    def get_doc(self, doc_id):
+        """
+        Returns a tuple of the filename, start position, length, class and
+        name of the given document
+        """
+        return (self.files[self.doc_file[doc_id]],
+                self.doc_pos[doc_id],
+                self.doc_length[doc_id],
+                self.classes[self.doc_class[doc_id]],
+                self.doc_names[doc_id])
+
+    def _find(self, arr, value):
+        """
+        Returns the position of `value` in the sorted array `arr`, or `None`
+        """
+        idx = bisect.bisect_left(arr, value)
+        if idx < len(arr) and arr[idx] == value:
+            return idx
+        return None
+
+    def get_candidates(self, search_str):
+        """
+        Returns a sorted list of the IDs of the documents which might
+        contain `search_str` (case-insensitively), or `None` if the index
+        can't narrow things down for this search string, in which case
+        every document is a candidate.
+        """
+        try:
+            raw = search_str.lower().encode('latin1')
+        except UnicodeEncodeError:
+            # The dumps are latin1, so this can't match anything
+            return []
+        if b'\n' in raw:
+            return None
+        candidates = None
+        posting_lists = []
+        for trigram in get_trigrams(raw):
+            if trigram & 0x808080:
+                continue
+            idx = self._find(self.trigrams, trigram)
+            if idx is None:
+                if self._find(self.stopped, trigram) is None:
+                    # This trigram isn't anywhere in the data
+                    return []
+                continue
+            posting_lists.append((self.posting_first[idx+1] - self.posting_first[idx], idx))
+        if not posting_lists:
+            return None
+        for (length, idx) in sorted(posting_lists):
+            doc_ids = decode_postings(self.postings[self.posting_first[idx]:self.posting_first[idx+1]])
+            if candidates is None:
+                candidates = set(doc_ids)
+            else:
+                candidates.intersection_update(doc_ids)
+            if not candidates:
+                break
+        return sorted(candidates)
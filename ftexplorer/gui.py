@@ -27,6 +27,7 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import re
+import threading
 import qdarkgraystyle
 from bpdeditor.bpd_gui import BPDWindow
 from . import data
@@ -38,6 +39,7 @@ class MainTree(QtWidgets.QTreeView):
     """
 
     object_role = QtCore.Qt.UserRole + 1
+    populated_role = QtCore.Qt.UserRole + 2
 
     def __init__(self, parent, data, display):
 
@@ -52,6 +54,7 @@ class MainTree(QtWidgets.QTreeView):
 
         self.model = QtGui.QStandardItemModel()
         self.setModel(self.model)
+        self.expanded.connect(self.populate_index)
 
         self.load_data(data)
 
@@ -67,16 +70,37 @@ class MainTree(QtWidgets.QTreeView):
 
     def add_to_tree(self, item, parent):
         """
-        Adds the specified item to the specified parent object,
-        recursively.
+        Adds the specified item to the specified parent object.  Its
+        children aren't added until it's expanded (see `populate`), since
+        building the whole tree up front takes a lot of time and memory;
+        until then, it just gets an empty placeholder child, so that it
+        can be expanded.
         """
         item_obj = QtGui.QStandardItem(item.name)
         item_obj.setData(item, self.object_role)
         item_obj.setEditable(False)
-        for next_item in item:
-            self.add_to_tree(next_item, item_obj)
+        if len(item.children) > 0:
+            item_obj.setData(False, self.populated_role)
+            item_obj.appendRow([QtGui.QStandardItem()])
         parent.appendRow([item_obj])
 
+    def populate(self, item_obj):
+        """
+        Adds the children of the given tree item, if they haven't been
+        added already
+        """
+        if item_obj.data(self.populated_role) is False:
+            item_obj.setData(True, self.populated_role)
+            item_obj.removeRows(0, item_obj.rowCount())
+            for next_item in item_obj.data(self.object_role):
+                self.add_to_tree(next_item, item_obj)
+
+    def populate_index(self, index):
+        """
+        Adds the children of the tree item at `index` when it's expanded
+        """
+        self.populate(self.model.itemFromIndex(index))
+
     def selectionChanged(self, selected, deselected):
         """
         What to do when our selection changes.  Mostly just updating
@@ -104,6 +128,7 @@ class MainTree(QtWidgets.QTreeView):
         found_path = False
         for path in paths:
             path_compare = path.name.lower()
+            self.populate(current)
             rowcount = current.rowCount()
             found_inner = False
             for rownum in range(rowcount):
@@ -342,40 +367,97 @@ class DataDisplay(QtWidgets.QTextEdit):
         if self.search_str:
             self.find(self.search_str)
 
+class DataLoader(QtCore.QThread):
+    """
+    Background thread which constructs the Data objects for games that
+    haven't been loaded yet, one at a time.  Games can be bumped to the
+    front of the line with `prioritize`, if the user switches to one
+    before we've gotten to it.  If a game can't be loaded, we send along
+    the error message instead.
+    """
+
+    game_started = QtCore.pyqtSignal(str)
+    game_loaded = QtCore.pyqtSignal(str, object)
+    game_failed = QtCore.pyqtSignal(str, str)
+
+    def __init__(self, parent, games):
+        super().__init__(parent)
+        self.lock = threading.Lock()
+        self.queue = list(games)
+        self.total = len(games)
+
+    def prioritize(self, game):
+        """
+        Loads the given game next, if it's still waiting to be loaded
+        """
+        with self.lock:
+            if game in self.queue:
+                self.queue.remove(game)
+                self.queue.insert(0, game)
+
+    def cancel(self):
+        """
+        Don't load any more games after the current one
+        """
+        with self.lock:
+            self.queue = []
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.queue:
+                    return
+                game = self.queue.pop(0)
+            self.game_started.emit(game)
+            try:
+                game_data = data.Data(GameSelect.game_names[game])
+            except Exception as e:
+                self.game_failed.emit(game, str(e))
+                continue
+            self.game_loaded.emit(game, game_data)
+
 class GameSelect(QtWidgets.QComboBox):
     """
     ComboBox to switch between BL2/TPS/AoDK data
     """
 
-    def __init__(self, parent, maingui, data_bl2, data_tps, data_aodk):
+    # Our game IDs (as stored in our settings), mapped to the game names
+    # used by Data, and the labels we show to the user.
+    game_names = {
+            'bl2': 'BL2',
+            'tps': 'TPS',
+            'aodk': 'AoDK',
+            }
+    game_labels = {
+            'bl2': 'Borderlands 2',
+            'tps': 'Pre-Sequel',
+            'aodk': 'Dragon Keep (standalone)',
+            }
+
+    def __init__(self, parent, maingui):
         super().__init__(parent)
         self.maingui = maingui
-        self.data_bl2 = data_bl2
-        self.data_tps = data_tps
-        self.data_aodk = data_aodk
-        self.addItem('Borderlands 2', data_bl2)
-        self.addItem('Pre-Sequel', data_tps)
-        self.addItem('Dragon Keep (standalone)', data_aodk)
-        current_game = self.maingui.settings.value('toggles/game', 'bl2')
-        if current_game == 'bl2':
-            self.setCurrentIndex(0)
-        elif current_game == 'tps':
-            self.setCurrentIndex(1)
-        else:
-            self.setCurrentIndex(2)
+        for (game, label) in self.game_labels.items():
+            self.addItem(label, game)
+        self.setCurrentIndex(self.findData(self.get_current_game(self.maingui.settings)))
         self.currentIndexChanged.connect(self.index_changed)
         self.setSizeAdjustPolicy(self.AdjustToContents)
 
+    @staticmethod
+    def get_current_game(settings):
+        """
+        Returns the ID of the game which was last selected
+        """
+        current_game = settings.value('toggles/game', 'bl2')
+        if current_game in GameSelect.game_names:
+            return current_game
+        return 'aodk'
+
     def index_changed(self, index):
         """
         User selected a new game
         """
-        if index == 0:
-            self.maingui.settings.setValue('toggles/game', 'bl2')
-        elif index == 1:
-            self.maingui.settings.setValue('toggles/game', 'tps')
-        elif index == 2:
-            self.maingui.settings.setValue('toggles/game', 'aodk')
+        self.maingui.settings.setValue('toggles/game', self.currentData())
         self.maingui.switch_game(self.currentData())
 
 class MainToolBar(QtWidgets.QToolBar):
@@ -383,7 +465,7 @@ class MainToolBar(QtWidgets.QToolBar):
     Toolbar to hold a few toggles for us
     """
 
-    def __init__(self, parent, data_bl2, data_tps, data_aodk):
+    def __init__(self, parent):
 
         super().__init__(parent)
 
@@ -412,7 +494,7 @@ class MainToolBar(QtWidgets.QToolBar):
         self.addWidget(spacer_label)
 
         # Game selection
-        self.game_select = GameSelect(self, parent, data_bl2, data_tps, data_aodk)
+        self.game_select = GameSelect(self, parent)
         self.game_select.setSizePolicy(QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Preferred)
         self.addWidget(self.game_select)
 
@@ -421,14 +503,18 @@ class GUI(QtWidgets.QMainWindow):
     Main application window
     """
 
-    def __init__(self, settings, data_bl2, data_tps, data_aodk, app):
+    def __init__(self, settings, app):
         super().__init__()
 
-        # Store our data
+        # Store our data.  Game data is loaded as-needed, and kept in
+        # `game_data`, keyed by game ID.  `queued_games` are the games our
+        # background loader hasn't handed over yet.
         self.settings = settings
-        self.data_bl2 = data_bl2
-        self.data_tps = data_tps
-        self.data_aodk = data_aodk
+        self.game_data = {}
+        self.queued_games = set()
+        self.pending_game = None
+        self.loading = False
+        self.closing = False
         self.data = None
         self.bpd_windows=[]
         self.app = app
@@ -460,7 +546,7 @@ class GUI(QtWidgets.QMainWindow):
         find_next_return.activated.connect(self.action_find_next)
 
         # Load our toolbar
-        self.toolbar = MainToolBar(self, data_bl2, data_tps, data_aodk)
+        self.toolbar = MainToolBar(self)
         self.addToolBar(self.toolbar)
 
         # Set up a QSplitter
@@ -469,14 +555,11 @@ class GUI(QtWidgets.QMainWindow):
         # Set up our display area and add it to the hbox
         self.display = DataDisplay(self)
 
-        # Set up our treeview
-        current_game = self.settings.value('toggles/game', 'bl2')
-        if current_game == 'bl2':
-            self.data = self.data_bl2
-        elif current_game == 'tps':
-            self.data = self.data_tps
-        else:
-            self.data = self.data_aodk
+        # Set up our treeview.  Only the last-used game is loaded up
+        # front; the others get loaded in the background once we're up.
+        current_game = GameSelect.get_current_game(self.settings)
+        self.game_data[current_game] = data.Data(GameSelect.game_names[current_game])
+        self.data = self.game_data[current_game]
         self.treeview = MainTree(self, self.data, self.display)
         # Restore last opened node if set
         if self.settings.contains('mainwindow/lastobjectname'):
@@ -509,9 +592,77 @@ class GUI(QtWidgets.QMainWindow):
         if splitter_settings:
             self.splitter.restoreState(splitter_settings)
 
+        # Progress indicator for our background loading
+        self.load_label = QtWidgets.QLabel()
+        self.load_progress = QtWidgets.QProgressBar()
+        self.load_progress.setMaximumWidth(150)
+        self.statusBar().addPermanentWidget(self.load_label)
+        self.statusBar().addPermanentWidget(self.load_progress)
+
         # Here we go!
         self.show()
 
+        # Now start loading the other games
+        to_load = [game for game in GameSelect.game_names if game != current_game]
+        self.queued_games = set(to_load)
+        self.loader = DataLoader(self, to_load)
+        self.loader.game_started.connect(self.game_load_started)
+        self.loader.game_loaded.connect(self.game_loaded)
+        self.loader.game_failed.connect(self.game_load_failed)
+        self.loader.finished.connect(self.game_loads_finished)
+        self.load_progress.setRange(0, self.loader.total)
+        self.load_progress.setValue(0)
+        self.loading = True
+        self.loader.start()
+
+    def game_load_started(self, game):
+        """
+        Our background loader has started loading the given game
+        """
+        self.load_label.setText('Loading {} data...'.format(GameSelect.game_labels[game]))
+
+    def game_loaded(self, game, game_data):
+        """
+        Our background loader has finished loading the given game.  If the
+        user's waiting on it, switch over.
+        """
+        self.game_data[game] = game_data
+        self.queued_games.discard(game)
+        self.load_progress.setValue(self.load_progress.value() + 1)
+        if self.pending_game == game:
+            self.pending_game = None
+            self.switch_game(game)
+
+    def game_load_failed(self, game, error):
+        """
+        Our background loader couldn't load the given game.  Let the user
+        know, and if they were waiting on it, stop waiting.
+        """
+        self.queued_games.discard(game)
+        self.load_progress.setValue(self.load_progress.value() + 1)
+        if self.pending_game == game:
+            self.pending_game = None
+            self.display.setText('(could not load {} data)'.format(GameSelect.game_labels[game]))
+        if not self.closing:
+            QtWidgets.QMessageBox.critical(self,
+                'Error',
+                'Could not load {} data: {}'.format(GameSelect.game_labels[game], error))
+
+    def game_loads_finished(self):
+        """
+        Our background loader is done, so hide the progress indicator.  If
+        a game the user is waiting on never arrived, load it here instead.
+        If we were waiting on the loader to close the window, do so now.
+        """
+        self.loading = False
+        self.load_label.hide()
+        self.load_progress.hide()
+        self.queued_games.clear()
+        if self.closing:
+            self.close()
+        elif self.pending_game is not None:
+            self.switch_game(self.pending_game)
+
     def action_quit(self):
         """
         Exit the app
@@ -520,8 +671,18 @@ class GUI(QtWidgets.QMainWindow):
 
     def closeEvent(self, event):
         """
-        Save our window state; used when the app is closing.
-        """
+        Save our window state; used when the app is closing.  Also stop
+        any background loading.  A game that's partway through loading
+        can't be interrupted, so in that case we just hide the window and
+        close for real once the loader is done (see `game_loads_finished`).
+        """
+        self.loader.cancel()
+        if self.loading:
+            self.closing = True
+            self.hide()
+            event.ignore()
+            return
+        self.loader.wait()
         self.settings.setValue('mainwindow/width', self.size().width())
         self.settings.setValue('mainwindow/height', self.size().height())
         self.settings.setValue('mainwindow/splitter', self.splitter.saveState())
@@ -759,13 +920,24 @@ class GUI(QtWidgets.QMainWindow):
             self.toolbar.action_bpd_editor.setChecked(False)
             QtWidgets.QMessageBox.information(self, 'Error', 'Current object is not a BPD!')
 
-    def switch_game(self, data):
-        """
-        Switches to the game data contained in `data`.  Called
-        from our GameSelect combo box
-        """
-        self.treeview.load_data(data)
-        self.data = data
+    def switch_game(self, game):
+        """
+        Switches to the game data for the game ID `game`.  Called from our
+        GameSelect combo box.  If the game is still waiting to be loaded
+        in the background (or has been loaded, but we haven't gotten the
+        signal yet), we'll switch once it arrives.
+        """
+        if game not in self.game_data:
+            if game in self.queued_games:
+                self.pending_game = game
+                self.loader.prioritize(game)
+                self.treeview.model.clear()
+                self.display.setText('(loading {} data...)'.format(GameSelect.game_labels[game]))
+                return
+            self.game_data[game] = data.Data(GameSelect.game_names[game])
+        self.pending_game = None
+        self.treeview.load_data(self.game_data[game])
+        self.data = self.game_data[game]
         self.display.initial_display()
 
 class Application(QtWidgets.QApplication):
@@ -780,8 +952,5 @@ class Application(QtWidgets.QApplication):
 
         super().__init__([])
         settings = QtCore.QSettings('Apocalyptech', 'FT Explorer')
-        data_bl2 = data.Data('BL2')
-        data_tps = data.Data('TPS')
-        data_aodk = data.Data('AoDK')
-        self.app = GUI(settings, data_bl2, data_tps, data_aodk, self)
+        self.app = GUI(settings, self)
 
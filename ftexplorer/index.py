@@ -0,0 +1,610 @@
+#!/usr/bin/env python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+
+# Copyright (c) 2018-2021, CJ Kucera
+# All rights reserved.
+#   
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import lzma
+import json
+import array
+import collections
+from . import packed
+
+# Reading and writing our game indexes.  See `generate_indexes.py` for the
+# details of what goes into an index.  There are two on-disk formats:
+#
+#   `index.json.xz`: The original format, and the easiest to poke at.
+#      Loading it means decompressing and parsing the whole thing, which
+#      for BL2 produces millions of small Python objects.
+#
+#   `index.bin`: A packed file (see `packed.py`) which can be `mmap`ed and
+#      used directly.  Rather than a list of objects per file, this stores
+#      the whole object tree, in breadth-first order, with the children of
+#      each node stored contiguously and sorted (case-insensitively) by
+#      name.  Each node's name is an index into a string table of name
+#      components.  The sections are:
+#
+#         `names`: String table of name components
+#         `files`: String table of dump filenames
+#         `blocks`: Block tables for all files (see `dumps.py`), flattened
+#            into a single list with four elements per block
+#         `file_blocks`: For each file, the index of its first block in
+#            `blocks`, plus a final entry for the total number of blocks
+#         `node_name`: Name ID for each node
+#         `node_parent`: Parent node ID for each node (the root node is
+#            always node 0, and is its own parent)
+#         `node_first_child`, `node_child_count`: The range of node IDs
+#            which are children of each node
+#         `node_file`: File ID for each node, or -1 if the node has no data
+#         `node_pos`, `node_length`: Uncompressed start position and length
+#         `node_block`, `node_block_offset`: Block ID (relative to the
+#            file's first block, or -1) and the position inside the block
+#         `node_sep`: The separator (`.` or `:`, as a byte) which comes
+#            before this node's name in a full object name, or 0
+#         `classes`: String table of object classes, sorted
+#         `node_class`: Class ID for each node, or -1 if the node has no
+#            data
+#         `class_nodes`: The node IDs of all objects, grouped by class and
+#            sorted (case-insensitively) by full object name within each
+#            class
+#         `class_first`: For each class, the index of its first node in
+#            `class_nodes`, plus a final entry for the total number of nodes
+#         `ref_target_nodes`: Sorted node IDs of every object which is
+#            referenced by another object, by way of a reference like
+#            `BehaviorProviderDefinition'GD_Foo.Bar:BehaviorProviderDefinition_0'`
+#         `ref_targets`: Sorted string table of the (lowercased) names of
+#            any other referenced things, which aren't in our tree
+#         `ref_first`: For each target (those in `ref_target_nodes` first,
+#            then those in `ref_targets`), the index of its first referrer
+#            in `ref_nodes`, plus a final entry for the total number of
+#            referrers
+#         `ref_nodes`: The node IDs of the objects which reference each
+#            target, grouped by target
+#         `props`: Sorted string table of the names of all the top-level
+#            properties defined by objects (not counting the base `Object`
+#            properties which every object has; see
+#            `dumps.get_property_names`)
+#         `prop_first`: For each property, the index of its first node in
+#            `prop_nodes`, plus a final entry for the total number of nodes
+#         `prop_nodes`: The node IDs of the objects which define each
+#            property, grouped by property and sorted by node ID
+#
+# Indexes generated before we kept track of object classes won't have the
+# `node_sep` through `class_first` sections (or the equivalent data in the
+# JSON index).  The reference and property sections are only found in
+# binary indexes, and only if `generate_indexes.py` was given the
+# references and properties to store.
+#
+# Both formats can also hold a "manifest" describing the dump files the
+# index was generated from: for each file, its size, modification time
+# (in nanoseconds) and hash (see `dumps.file_hash`).  In the JSON index
+# that's a `manifest` dict alongside `files`; in the binary index it's
+# the `manifest_files`, `manifest_size`, `manifest_mtime` and
+# `manifest_hash` sections.  Indexes from before the manifest was added
+# don't have one.
+
+json_index_name = 'index.json.xz'
+binary_index_name = 'index.bin'
+index_names = {
+        'json': json_index_name,
+        'binary': binary_index_name,
+        }
+
+def find_index(game_dir):
+    """
+    Returns a tuple of the format (`json` or `binary`) and path of the index
+    we should use for the given game dump directory, or `(None, None)` if
+    there isn't one.  If both are present, the newer of the two wins.
+    """
+    candidates = []
+    for (index_format, name) in index_names.items():
+        path = os.path.join(game_dir, name)
+        if os.path.exists(path):
+            candidates.append((os.path.getmtime(path), index_format, path))
+    if not candidates:
+        return (None, None)
+    (mtime, index_format, path) = max(candidates, key=lambda c: c[0])
+    return (index_format, path)
+
+def read_json_index(filename, with_manifest=False):
+    """
+    Reads the JSON index at `filename`, and returns its `files` dict.
+    Older indexes are converted on the way in: version 1 indexes were
+    just a dict of object lists, without any block information, and
+    neither version 1 nor 2 had object classes or name separators.  If
+    `with_manifest` is `True`, returns a tuple of the `files` dict and the
+    index's manifest (or `None`, if it doesn't have one).
+    """
+    with lzma.open(filename, 'rt') as df:
+        index = json.load(df)
+    manifest = None
+    if 'version' not in index:
+        files = {dump_name: {'blocks': [], 'classes': [],
+                    'objects': [list(obj) + [-1, obj[1], -1, None] for obj in objects]}
+                for (dump_name, objects) in index.items()}
+    else:
+        if index['version'] == 2:
+            for filename_data in index['files'].values():
+                filename_data['classes'] = []
+                filename_data['objects'] = [list(obj) + [-1, None] for obj in filename_data['objects']]
+        files = index['files']
+        manifest = index.get('manifest')
+    if with_manifest:
+        return (files, manifest)
+    return files
+
+def read_json_tree(filename):
+    """
+    Reads the JSON index at `filename` straight into a `TreeArrays` (see
+    `build_tree`), whose manifest is set from the index's, if it has one.
+    Unlike `read_json_index`, objects from older index formats aren't
+    converted first, which saves a fair bit of time and memory.
+    """
+    with lzma.open(filename, 'rt') as df:
+        index = json.load(df)
+    manifest = None
+    if 'version' not in index:
+        files = {dump_name: {'blocks': [], 'classes': [], 'objects': objects}
+                for (dump_name, objects) in index.items()}
+    else:
+        files = index['files']
+        for filename_data in files.values():
+            filename_data.setdefault('classes', [])
+        manifest = index.get('manifest')
+    del index
+    tree = build_tree(files)
+    tree.manifest = manifest
+    return tree
+
+def write_json_index(filename, files, manifest=None):
+    """
+    Writes out the given `files` dict as a JSON index, along with the
+    given `manifest`, if any.  The manifest is a dict keyed by dump
+    filename, whose values are dicts with `size`, `mtime_ns` and `hash`
+    keys.
+    """
+    index = {'version': 3, 'files': files}
+    if manifest is not None:
+        index['manifest'] = manifest
+    # Encoding the whole thing up front is a lot quicker than having
+    # `json.dump` write it out bit by bit.
+    with lzma.open(filename, 'wt') as df:
+        df.write(json.dumps(index))
+
+# A fresh clone or copy of the dump files won't keep their mtimes, so a
+# file whose size matches the manifest but whose mtime doesn't just gets its
+# hash checked (see `Data.verify_file`).  Once a file passes that check, its
+# current mtime is saved next to the index in `index.verified.json`, so it
+# won't need hashing again.  Entries in there only count while their size
+# and hash still match the index's manifest.
+
+verified_name = 'index.verified.json'
+
+def read_verified(filename):
+    """
+    Returns the dict of verified dump files saved at `filename` (see
+    `write_verified`), or an empty dict if there isn't one.
+    """
+    try:
+        with open(filename) as df:
+            return json.load(df)
+    except (OSError, ValueError):
+        return {}
+
+def write_verified(filename, verified):
+    """
+    Saves the given dict of verified dump files to `filename`.  It's keyed
+    by dump filename, with values like the manifest's: dicts with `size`,
+    `mtime_ns` and `hash` keys.  Failing to write it isn't an error, since
+    it only saves us some hashing next time.
+    """
+    try:
+        with open('{}.tmp'.format(filename), 'w') as df:
+            json.dump(verified, df)
+        os.replace('{}.tmp'.format(filename), filename)
+    except OSError:
+        pass
+
+def read_manifest(index_format, filename):
+    """
+    Returns the manifest stored in the index at `filename` (whose format is
+    `json` or `binary`, as returned by `find_index`), or `None` if the
+    index doesn't have one.
+    """
+    if index_format == 'binary':
+        return BinaryIndex(filename).get_manifest()
+    return read_json_index(filename, with_manifest=True)[1]
+
+class TreeArrays(object):
+    """
+    An in-memory version of the node tree stored in a binary index, as
+    built by `build_tree`.  This has all the same attributes as
+    `BinaryIndex`, though `files` is a regular list.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.files = []
+        self.blocks = array.array('Q')
+        self.file_blocks = array.array('I')
+        self.node_name = array.array('I')
+        self.node_parent = array.array('I')
+        self.node_first_child = array.array('I')
+        self.node_child_count = array.array('I')
+        self.node_file = array.array('i')
+        self.node_pos = array.array('I')
+        self.node_length = array.array('I')
+        self.node_block = array.array('i')
+        self.node_block_offset = array.array('I')
+        self.node_sep = array.array('B')
+        self.classes = []
+        self.node_class = array.array('i')
+        self.class_nodes = array.array('I')
+        self.class_first = array.array('I', [0])
+        self.ref_target_nodes = array.array('I')
+        self.ref_targets = []
+        self.ref_first = array.array('Q', [0])
+        self.ref_nodes = array.array('I')
+        self.props = []
+        self.prop_first = array.array('Q', [0])
+        self.prop_nodes = array.array('I')
+        self.manifest = None
+
+    def __len__(self):
+        return len(self.node_parent)
+
+    @property
+    def has_classes(self):
+        """
+        Whether or not we know the class of each object (older indexes
+        didn't store that)
+        """
+        return len(self.classes) > 0
+
+    @property
+    def has_refs(self):
+        """
+        Whether or not we have a reverse-reference table
+        """
+        return len(self.ref_first) > 1
+
+    @property
+    def has_props(self):
+        """
+        Whether or not we have a table of the properties each object defines
+        """
+        return len(self.prop_first) > 1
+
+    def get_manifest(self):
+        """
+        Returns the manifest of the dump files this tree was built from (see
+        `write_json_index`), or `None` if we don't know it.
+        """
+        return self.manifest
+
+    def get_block_table(self, file_id):
+        """
+        Returns the block table for the given file ID, as a list of tuples
+        """
+        start = self.file_blocks[file_id]
+        end = self.file_blocks[file_id+1]
+        return [tuple(self.blocks[idx*4:idx*4+4]) for idx in range(start, end)]
+
+def build_tree(files, refs=None, props=None):
+    """
+    Builds the node tree for the given `files` dict (as found in a JSON
+    index), laid out the same way as in a binary index.  Returns a
+    `TreeArrays` object.  Objects can be in any of the JSON index formats
+    (see `read_json_index`), so older indexes don't need converting first.
+    If `refs` is given, the reverse-reference table is built too; it
+    should be a dict keyed by filename, whose values are lists (parallel
+    to the file's `objects` list) of the lowercased names each object
+    references.  Likewise, if `props` is given, the property table is
+    built from the lists of property names each object defines.
+    """
+
+    # Build up the tree.  Nodes are numbered in the order we find them,
+    # and for each we keep (in parallel lists) its name, a dict of its
+    # children keyed by lowercase name (only created once it has some),
+    # its object data (if any), and the separator in front of its name.
+    # As with the main app, if an object shows up more than once, the last
+    # one wins.
+    tree = TreeArrays()
+    tree.files = list(files.keys())
+    node_names = ['']
+    node_children = [None]
+    node_data = [None]
+    node_seps = [0]
+    node_refs = {}
+    node_props = {}
+    for (file_id, (filename, filename_data)) in enumerate(files.items()):
+        classes = filename_data['classes']
+        for (obj_idx, obj) in enumerate(filename_data['objects']):
+            if len(obj) == 7:
+                (parts, pos_start, length, block_id, block_offset, class_id, seps) = obj
+            elif len(obj) == 5:
+                (parts, pos_start, length, block_id, block_offset) = obj
+                (class_id, seps) = (-1, None)
+            else:
+                (parts, pos_start, length) = obj
+                (block_id, block_offset, class_id, seps) = (-1, pos_start, -1, None)
+            # `parts` may have an extra collapsed level in front of the real
+            # name parts, which doesn't get a separator.
+            if seps is None:
+                seps = '.'*(len(parts)-1)
+            first_part = len(parts) - len(seps) - 1
+            node_id = 0
+            for (idx, part) in enumerate(parts):
+                children = node_children[node_id]
+                if children is None:
+                    children = node_children[node_id] = {}
+                lower = part.lower()
+                child_id = children.get(lower)
+                if child_id is None:
+                    child_id = children[lower] = len(node_names)
+                    node_names.append(part)
+                    node_children.append(None)
+                    node_data.append(None)
+                    node_seps.append(0)
+                node_id = child_id
+                if idx > first_part:
+                    node_seps[node_id] = ord(seps[idx-first_part-1])
+            if class_id >= 0:
+                full_name = parts[first_part] + ''.join(sep+part for (sep, part) in zip(seps, parts[first_part+1:]))
+                obj_class = (classes[class_id], full_name.lower())
+            else:
+                obj_class = None
+            node_data[node_id] = (file_id, pos_start, length, block_id, block_offset, obj_class)
+            if refs is not None:
+                node_refs[node_id] = refs[filename][obj_idx]
+            if props is not None:
+                node_props[node_id] = props[filename][obj_idx]
+
+    # Now lay it out breadth-first.  `order` is the list of our node
+    # numbers in their final order, so a node's final ID is its position in
+    # there.
+    order = [0]
+    parents = [0]
+    first_children = []
+    child_counts = []
+    for (node_id, temp_id) in enumerate(order):
+        children = node_children[temp_id]
+        first_children.append(len(order))
+        if children:
+            child_counts.append(len(children))
+            for key in sorted(children.keys()):
+                order.append(children[key])
+                parents.append(node_id)
+        else:
+            child_counts.append(0)
+    name_ids = {}
+    tree.node_name = array.array('I', [name_ids.setdefault(node_names[temp_id], len(name_ids)) for temp_id in order])
+    # Names are packed into a string table, rather than kept as a list of
+    # the strings we read in, so that all the memory those came from can
+    # actually be freed once the caller is done with `files`.
+    tree.names = packed.StringTable(*packed.pack_strings(name_ids.keys()))
+    del name_ids
+    tree.node_parent = array.array('I', parents)
+    tree.node_first_child = array.array('I', first_children)
+    tree.node_child_count = array.array('I', child_counts)
+    tree.node_sep = array.array('B', [node_seps[temp_id] for temp_id in order])
+    no_data = (-1, 0, 0, -1, 0, None)
+    ordered_data = [node_data[temp_id] or no_data for temp_id in order]
+    tree.node_file = array.array('i', [obj_data[0] for obj_data in ordered_data])
+    tree.node_pos = array.array('I', [obj_data[1] for obj_data in ordered_data])
+    tree.node_length = array.array('I', [obj_data[2] for obj_data in ordered_data])
+    tree.node_block = array.array('i', [obj_data[3] for obj_data in ordered_data])
+    tree.node_block_offset = array.array('I', [obj_data[4] for obj_data in ordered_data])
+
+    # Class lookups
+    class_members = {}
+    for (node_id, obj_data) in enumerate(ordered_data):
+        if obj_data[5] is not None:
+            (obj_class, sort_name) = obj_data[5]
+            class_members.setdefault(obj_class, []).append((sort_name, node_id))
+    del ordered_data
+    tree.classes = sorted(class_members.keys())
+    class_ids = {obj_class: class_id for (class_id, obj_class) in enumerate(tree.classes)}
+    tree.node_class = array.array('i', [-1])*len(order)
+    for obj_class in tree.classes:
+        for (sort_name, node_id) in sorted(class_members[obj_class]):
+            tree.class_nodes.append(node_id)
+            tree.node_class[node_id] = class_ids[obj_class]
+        tree.class_first.append(len(tree.class_nodes))
+
+    # Reverse references.  We need the full (lowercased) name of each
+    # object for these; collapsed levels (and the root) aren't part of the
+    # name.  Targets which are in our tree are stored by node ID, and
+    # everything else by name.  The referrer node IDs are already in
+    # order, since we add them in order.
+    if refs is not None:
+        full_names = {}
+        node_full_names = ['']
+        referrers = {}
+        for (node_id, temp_id) in enumerate(order):
+            full_name = node_full_names[parents[node_id]]
+            name = node_names[temp_id]
+            if node_id != 0 and not name.endswith('*'):
+                if full_name:
+                    sep = node_seps[temp_id]
+                    full_name = '{}{}{}'.format(full_name, chr(sep) if sep else '.', name.lower())
+                else:
+                    full_name = name.lower()
+                full_names[full_name] = node_id
+            if node_id != 0:
+                node_full_names.append(full_name)
+            for target in node_refs.get(temp_id) or []:
+                referrers.setdefault(target, []).append(node_id)
+        node_targets = []
+        named_targets = []
+        for target in referrers.keys():
+            if target in full_names:
+                node_targets.append((full_names[target], target))
+            else:
+                named_targets.append(target)
+        node_targets.sort()
+        named_targets.sort()
+        tree.ref_target_nodes = array.array('I', [node_id for (node_id, target) in node_targets])
+        tree.ref_targets = named_targets
+        for target in [target for (node_id, target) in node_targets] + named_targets:
+            tree.ref_nodes.extend(referrers[target])
+            tree.ref_first.append(len(tree.ref_nodes))
+
+    # Property definitions.  As with references, the node IDs are already
+    # in order.
+    if props is not None:
+        definers = {}
+        for (node_id, temp_id) in enumerate(order):
+            for prop in node_props.get(temp_id) or []:
+                definers.setdefault(prop, []).append(node_id)
+        tree.props = sorted(definers.keys())
+        for prop in tree.props:
+            tree.prop_nodes.extend(definers[prop])
+            tree.prop_first.append(len(tree.prop_nodes))
+
+    # Block tables
+    for filename_data in files.values():
+        tree.file_blocks.append(len(tree.blocks)//4)
+        for block in filename_data['blocks']:
+            tree.blocks.extend(block)
+    tree.file_blocks.append(len(tree.blocks)//4)
+
+    return tree
+
+def write_binary_index(filename, files, manifest=None, refs=None, props=None):
+    """
+    Writes out the given `files` dict as a binary index, along with the
+    given `manifest` (see `write_json_index`), references and properties
+    (see `build_tree`), if any.
+    """
+    write_binary_tree(filename, build_tree(files, refs, props), manifest)
+
+def write_binary_tree(filename, tree, manifest=None):
+    """
+    Writes out the given `TreeArrays` as a binary index, along with the
+    given `manifest` (see `write_json_index`), if any.
+    """
+    sections = {
+        'names': tree.names,
+        'files': tree.files,
+        'blocks': tree.blocks,
+        'file_blocks': tree.file_blocks,
+        'node_name': tree.node_name,
+        'node_parent': tree.node_parent,
+        'node_first_child': tree.node_first_child,
+        'node_child_count': tree.node_child_count,
+        'node_file': tree.node_file,
+        'node_pos': tree.node_pos,
+        'node_length': tree.node_length,
+        'node_block': tree.node_block,
+        'node_block_offset': tree.node_block_offset,
+        }
+    if tree.has_classes:
+        sections['node_sep'] = tree.node_sep
+        sections['classes'] = tree.classes
+        sections['node_class'] = tree.node_class
+        sections['class_nodes'] = tree.class_nodes
+        sections['class_first'] = tree.class_first
+    if tree.has_refs:
+        sections['ref_target_nodes'] = tree.ref_target_nodes
+        sections['ref_targets'] = tree.ref_targets
+        sections['ref_first'] = tree.ref_first
+        sections['ref_nodes'] = tree.ref_nodes
+    if tree.has_props:
+        sections['props'] = tree.props
+        sections['prop_first'] = tree.prop_first
+        sections['prop_nodes'] = tree.prop_nodes
+    if manifest is not None:
+        sections['manifest_files'] = list(manifest.keys())
+        sections['manifest_size'] = array.array('Q', [info['size'] for info in manifest.values()])
+        sections['manifest_mtime'] = array.array('Q', [info['mtime_ns'] for info in manifest.values()])
+        sections['manifest_hash'] = [info['hash'] for info in manifest.values()]
+    packed.write_packed(filename, sections)
+
+class BinaryIndex(TreeArrays):
+    """
+    A binary index, opened for reading.  All the sections described above
+    are available as attributes.
+    """
+
+    def __init__(self, filename):
+        self.packed = packed.PackedFile(filename)
+        self.names = self.packed.strings('names')
+        self.files = self.packed.strings('files')
+        self.blocks = self.packed.array('blocks')
+        self.file_blocks = self.packed.array('file_blocks')
+        self.node_name = self.packed.array('node_name')
+        self.node_parent = self.packed.array('node_parent')
+        self.node_first_child = self.packed.array('node_first_child')
+        self.node_child_count = self.packed.array('node_child_count')
+        self.node_file = self.packed.array('node_file')
+        self.node_pos = self.packed.array('node_pos')
+        self.node_length = self.packed.array('node_length')
+        self.node_block = self.packed.array('node_block')
+        self.node_block_offset = self.packed.array('node_block_offset')
+        if 'classes' in self.packed:
+            self.node_sep = self.packed.array('node_sep')
+            self.classes = self.packed.strings('classes')
+            self.node_class = self.packed.array('node_class')
+            self.class_nodes = self.packed.array('class_nodes')
+            self.class_first = self.packed.array('class_first')
+        else:
+            self.node_sep = None
+            self.classes = []
+            self.node_class = None
+            self.class_nodes = None
+            self.class_first = None
+        if 'ref_first' in self.packed:
+            self.ref_target_nodes = self.packed.array('ref_target_nodes')
+            self.ref_targets = self.packed.strings('ref_targets')
+            self.ref_first = self.packed.array('ref_first')
+            self.ref_nodes = self.packed.array('ref_nodes')
+        else:
+            self.ref_target_nodes = None
+            self.ref_targets = []
+            self.ref_first = array.array('Q', [0])
+            self.ref_nodes = None
+        if 'prop_first' in self.packed:
+            self.props = self.packed.strings('props')
+            self.prop_first = self.packed.array('prop_first')
+            self.prop_nodes = self.packed.array('prop_nodes')
+        else:
+            self.props = []
+            self.prop_first = array.array('Q', [0])
+            self.prop_nodes = None
+
+    def get_manifest(self):
+        """
+        Returns the manifest stored in this index (see `write_json_index`),
+        or `None` if there isn't one.
+        """
+        if 'manifest_files' not in self.packed:
+            return None
+        sizes = self.packed.array('manifest_size')
+        mtimes = self.packed.array('manifest_mtime')
+        hashes = self.packed.strings('manifest_hash')
+        return {filename: {'size': sizes[idx], 'mtime_ns': mtimes[idx], 'hash': hashes[idx]}
+                for (idx, filename) in enumerate(self.packed.strings('manifest_files'))}
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+
+# Copyright (c) 2018-2021, CJ Kucera
+# All rights reserved.
+#   
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+import mmap
+import array
+import struct
+
+# A very simple container format for a bunch of named, packed arrays,
+# which can be `mmap`ed and read without any parsing.  This is what our
+# binary indexes are stored in.  The layout is:
+#
+#   Header: magic, format version, number of sections
+#   Directory: for each section, its name, array typecode, offset and
+#      element count
+#   Section data, each aligned to eight bytes
+#
+# Everything is little-endian.  Lists of strings are stored as two
+# sections: `<name>.offsets` (a 'Q' array with one more element than there
+# are strings) and `<name>.data` (the latin1-encoded strings, all run
+# together).
+
+magic = b'FTXPACK\x00'
+version = 1
+header_struct = struct.Struct('<8sII')
+section_struct = struct.Struct('<32scxxxxxxxQQ')
+
+class StringTable(object):
+    """
+    A read-only list of strings backed by the offsets+data arrays of a
+    packed file.  Strings are decoded as they're requested.
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError('string table index out of range')
+        return str(self.data[self.offsets[idx]:self.offsets[idx+1]], 'latin1')
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+def pack_strings(strings):
+    """
+    Converts a list of strings to the offsets+data arrays used to store
+    them in a packed file.
+    """
+    offsets = array.array('Q', [0])
+    data = bytearray()
+    for string in strings:
+        data.extend(string.encode('latin1'))
+        offsets.append(len(data))
+    return (offsets, array.array('B', data))
+
+def write_packed(filename, sections):
+    """
+    Writes out a packed file to `filename`.  `sections` is a dict whose keys
+    are section names, and whose values are either `array.array` objects or
+    lists of strings.
+    """
+    arrays = []
+    for (name, value) in sections.items():
+        if isinstance(value, array.array):
+            arrays.append((name, value))
+        else:
+            (offsets, data) = pack_strings(value)
+            arrays.append(('{}.offsets'.format(name), offsets))
+            arrays.append(('{}.data'.format(name), data))
+
+    # Figure out where everything's going to live
+    pos = header_struct.size + section_struct.size*len(arrays)
+    directory = []
+    for (name, arr) in arrays:
+        pos = (pos+7) & ~7
+        directory.append(section_struct.pack(name.encode('ascii'),
+            arr.typecode.encode('ascii'), pos, len(arr)))
+        pos += arr.itemsize*len(arr)
+
+    # ... and write it all out
+    with open(filename, 'wb') as df:
+        df.write(header_struct.pack(magic, version, len(arrays)))
+        for entry in directory:
+            df.write(entry)
+        for (name, arr) in arrays:
+            df.write(b'\x00'*(-df.tell() & 7))
+            if sys.byteorder != 'little' and arr.itemsize > 1:
+                arr = array.array(arr.typecode, arr)
+                arr.byteswap()
+            arr.tofile(df)
+
+class PackedFile(object):
+    """
+    A packed file, opened for reading via `mmap`.  Arrays are returned as
+    memoryviews directly into the mapped file (except on big-endian
+    platforms, where they have to be copied and byteswapped).
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as df:
+            self.map = mmap.mmap(df.fileno(), 0, access=mmap.ACCESS_READ)
+        (file_magic, file_version, count) = header_struct.unpack_from(self.map, 0)
+        if file_magic != magic:
+            raise ValueError('{} is not a packed file'.format(filename))
+        if file_version != version:
+            raise ValueError('{} has unknown version {}'.format(filename, file_version))
+        self.sections = {}
+        for idx in range(count):
+            (name, typecode, offset, length) = section_struct.unpack_from(self.map,
+                    header_struct.size + section_struct.size*idx)
+            self.sections[name.rstrip(b'\x00').decode('ascii')] = (typecode.decode('ascii'), offset, length)
+
+    def __contains__(self, name):
+        return name in self.sections or '{}.offsets'.format(name) in self.sections
+
+    def array(self, name):
+        """
+        Returns the named array
+        """
+        (typecode, offset, length) = self.sections[name]
+        itemsize = array.array(typecode).itemsize
+        view = memoryview(self.map)[offset:offset+itemsize*length]
+        if sys.byteorder != 'little' and itemsize > 1:
+            arr = array.array(typecode, view.tobytes())
+            arr.byteswap()
+            return arr
+        return view.cast(typecode)
+
+    def strings(self, name):
+        """
+        Returns the named list of strings, as a `StringTable`
+        """
+        return StringTable(self.array('{}.offsets'.format(name)),
+                self.array('{}.data'.format(name)))
@@ -0,0 +1,571 @@
+#!/usr/bin/env python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+
+# Copyright (c) 2018-2021, CJ Kucera
+# All rights reserved.
+#   
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import re
+import weakref
+import collections.abc
+
+# Parsing for the property values found in dumps, such as:
+#
+#   (Foo=1,Bar=(Baz="Hello, world"),Items=((A=1),(A=2)))
+#
+# This used to be done by `Node.parse_data_value`, which walked the value
+# character-by-character and then re-parsed every parenthesized chunk it
+# found, handling quoted commas by temporarily swapping them out for
+# snowmen.  That was pretty slow, and anything nested more than a couple of
+# levels deep (or with a quoted comma inside a struct) came out mangled.
+#
+# Instead, we split the value up into tokens with a single regex (treating
+# anything inside double quotes as plain text), and then make a single
+# recursive-descent pass over those, so (barring some unusual values) each
+# token only gets looked at once.  The results have the same shapes the old parser produced:
+#
+#   * Structs become dicts, keyed by member name
+#   * Lists of structs (`((A=1),(A=2))`) become lists
+#   * Everything else stays a string, including bare lists such as
+#     `ConsolidatedLinkedVariables=(0,1,2)` inside a struct, which come out
+#     as `0,1,2` (scripts are used to splitting those themselves).  An
+#     empty struct member (`Foo=()`) is an empty string.
+#   * Unparenthesized values which look like `Foo=1,Bar=2` are dicts, too,
+#     though their values are always left as strings
+#   * A parenthesized top-level value which isn't a struct or a list
+#     comes out as an empty dict, as it always has
+#
+# Nothing is stripped or otherwise cleaned up; quotes are left on strings.
+# `sandbox/parser_differential.py` compares this against the old parser.
+#
+# Values can optionally be "typed" as well (see `decode_value`), in which
+# case the strings in them are turned into whatever they look like: ints,
+# floats, bools, `None`, or `ObjectRef`s for object references like
+# `Foo'Bar.Baz'`.  Quoted strings lose their quotes, bare lists inside
+# structs become lists (so `ConsolidatedLinkedVariables=(0,1,2)` is
+# `[0, 1, 2]`, just like a list of structs would be), and anything else is
+# left alone.
+
+# Matches a property line inside an object's data, such as `Foo=1` or
+# `Foo(0)=(Bar=1)`.  The groups are the property name, the array index
+# (with parens), the bare index, and the value.
+property_line_re = re.compile(r'^\s*([A-Za-z0-9_]+)(\((\d+)\))?=(.*)$')
+
+# Matches just the start of a property line, up through the equals sign
+# (see `LazyStructure`).  The groups are the property name and the array
+# index (with parens).
+property_start_re = re.compile(r'\s*([A-Za-z0-9_]+)(\(\d+\))?=')
+
+# Splits a value up into tokens: parens, commas, equals signs, quoted
+# strings, and runs of anything else.  A stray double quote is a token of
+# its own.  The engine doesn't escape quotes inside strings when it dumps
+# them (the BL2 credits have a few), so a quote only closes a string if
+# it's followed by a comma, close paren, or the end of the value.
+token_re = re.compile(r'"[^"]*(?:"(?![,)]|$)[^"]*)*"|[(),=]|[^(),="]+|"')
+special_tokens = set(['(', ')', ',', '='])
+end_tokens = set([',', ')'])
+
+# Matches the strings which get turned into something else when decoding
+# typed values.  The groups are: a constant (`None`, `True` or `False`), an
+# int, a float, the inside of a quoted string, and the class and name of
+# an object reference.
+typed_re = re.compile(r"""(?:(None|True|False)|(-?(?:0|[1-9][0-9]*))|(-?[0-9]+\.[0-9]+(?:[eE][-+]?[0-9]+)?)|"(.*)"|([A-Za-z0-9_]+)'([^']*)')\Z""", re.S)
+constants = {'None': None, 'True': True, 'False': False}
+
+# Matches object references, like `Foo'Bar.Baz'`, anywhere inside a string
+object_ref_re = re.compile(r"([A-Za-z0-9_]+)'([^']*)'")
+
+# Strings we've already decoded, so the same ones (and there are a *lot*
+# of `0.000000`s and `None`s) only have to be looked at once.  This gets
+# emptied out whenever it hits `max_decoded`, so it doesn't grow forever.
+# Object references aren't kept in here; `object_refs` already makes sure
+# there's only one of each (and is checked first), and holding on to them
+# here would keep them alive long after anything was using them.
+decoded = {}
+max_decoded = 200000
+
+# Every `ObjectRef` that's still in use, keyed by its string form, so
+# that there's only ever one of each.  These are weak references, so refs
+# go away along with the last structure using them.
+object_refs = weakref.WeakValueDictionary()
+
+class ObjectRef(object):
+    """
+    A reference to another object, such as `Foo'Bar.Baz'`, as found in
+    typed values (see `decode_value`).  `obj_type` is the object's class
+    and `name` its full object name, suitable for passing to
+    `Data.get_node_by_full_object`.  These are interned, so get them with
+    `get_object_ref` rather than creating them directly; converting one
+    to a string gives back the original reference.
+    """
+
+    __slots__ = ('obj_type', 'name', '__weakref__')
+
+    def __init__(self, obj_type, name):
+        self.obj_type = obj_type
+        self.name = name
+
+    def __repr__(self):
+        return 'ObjectRef(obj_type={!r}, name={!r})'.format(self.obj_type, self.name)
+
+    def __str__(self):
+        return "{}'{}'".format(self.obj_type, self.name)
+
+    def __eq__(self, other):
+        if type(other) != ObjectRef:
+            return NotImplemented
+        return self.obj_type == other.obj_type and self.name == other.name
+
+    def __hash__(self):
+        return hash((self.obj_type, self.name))
+
+    def __reduce__(self):
+        return (get_object_ref, (self.obj_type, self.name))
+
+def get_object_ref(obj_type, name):
+    """
+    Returns the (interned) `ObjectRef` for the given class and object name
+    """
+    key = "{}'{}'".format(obj_type, name)
+    ref = object_refs.get(key)
+    if ref is None:
+        ref = object_refs.setdefault(key, ObjectRef(obj_type, name))
+    return ref
+
+def decode_string(text):
+    """
+    Decodes a single string from a parsed value (see `decode_value`)
+    """
+    try:
+        return decoded[text]
+    except KeyError:
+        pass
+    ref = object_refs.get(text)
+    if ref is not None:
+        return ref
+    match = typed_re.match(text)
+    if match is None:
+        result = text
+    else:
+        (constant, int_val, float_val, quoted, obj_type, name) = match.groups()
+        if constant is not None:
+            result = constants[constant]
+        elif int_val is not None:
+            result = int(int_val)
+        elif float_val is not None:
+            result = float(float_val)
+        elif quoted is not None:
+            result = quoted
+        else:
+            return get_object_ref(obj_type, name)
+    if len(decoded) >= max_decoded:
+        decoded.clear()
+    decoded[text] = result
+    return result
+
+def decode_value(value):
+    """
+    Turns a parsed value (from `parse_value`) into a typed value, by
+    decoding all the strings inside it, recursively.  `None`, `True` and
+    `False` become the Python equivalents, numbers become ints or floats,
+    object references become `ObjectRef`s, and quoted strings lose their
+    quotes.  Any other strings (enum values, names and the like) are left
+    as they are, as are dict keys.  Bare lists inside structs should have
+    been split up by the parser already (see `ValueParser.bare_list`).
+    """
+    value_type = type(value)
+    if value_type is str:
+        return decode_string(value)
+    elif value_type is dict:
+        return {key: decode_value(inner) for (key, inner) in value.items()}
+    elif value_type is list:
+        return [decode_value(inner) for inner in value]
+    return value
+
+class ValueParser(object):
+    """
+    Parses a single property value (see `parse_value`).  The value is
+    split into tokens up front, and then we make a single recursive-descent
+    pass over them.  Most values are made up of nothing but structs, lists
+    of structs and simple strings, which are handled directly by `group`
+    and `member`.  For anything more unusual, we fall back to `parse_item`,
+    which collects the tokens up to the next top-level comma into an
+    "item" (a tuple of its first token, end token, the indexes of its
+    top-level equals signs, and its top-level groups, as tuples of their
+    open paren, end token and items), which can then be turned into a
+    value with `value_of`.  If `split_lists` is `True`, bare lists come
+    out as lists rather than strings (see `bare_list`).
+    """
+
+    def __init__(self, value, split_lists=False):
+        self.value = value
+        self.split_lists = split_lists
+        self.tokens = token_re.findall(value)
+        self.num_tokens = len(self.tokens)
+
+    def text(self, start, end):
+        """
+        Returns the original text of tokens `start` through `end`
+        """
+        return ''.join(self.tokens[start:end])
+
+    def bare_list(self, items, start, end):
+        """
+        Returns the value of the bare list (like `0,1,2`) made up of
+        `items`, which covers tokens `start` through `end`.  That's just
+        the original text, unless we're splitting lists and none of the
+        items look like struct members, in which case it's a list of the
+        items' values.
+        """
+        if self.split_lists and not any(item[2] for item in items):
+            return [self.value_of(*item, False) for item in items]
+        return self.text(start, end)
+
+    def at_end(self, idx):
+        """
+        Returns `True` if token `idx` ends a value (it's a comma, a close
+        paren, or past the end)
+        """
+        return idx >= self.num_tokens or self.tokens[idx] == ',' or self.tokens[idx] == ')'
+
+    def group(self, idx, member):
+        """
+        Parses the parenthesized group whose contents start at token `idx`.
+        `member` should be `True` if the group is the value of a struct
+        member, rather than a whole value or a list element; the two are
+        treated a little differently (see above).  Returns a tuple of the
+        value and the index of the token after the close paren.
+        """
+        tokens = self.tokens
+        num_tokens = self.num_tokens
+        group_start = idx
+        if idx < num_tokens and tokens[idx] == ')':
+            if member:
+                return ('', idx+1)
+            return ({}, idx+1)
+
+        # Lists of structs
+        if idx < num_tokens and tokens[idx] == '(':
+            values = []
+            while True:
+                if idx < num_tokens and tokens[idx] == '(':
+                    (value, end) = self.group(idx+1, False)
+                    if self.at_end(end):
+                        values.append(value)
+                        idx = end
+                    else:
+                        (item, idx) = self.parse_item(idx)
+                        values.append(self.value_of(*item, False))
+                elif not self.at_end(idx):
+                    (item, idx) = self.parse_item(idx)
+                    values.append(self.value_of(*item, False))
+                if idx < num_tokens and tokens[idx] == ',':
+                    idx += 1
+                elif idx < num_tokens:
+                    return (values, idx+1)
+                else:
+                    return (values, idx)
+
+        # Structs (or bare lists)
+        result = {}
+        first = True
+        while True:
+            if idx+1 < num_tokens and tokens[idx+1] == '=' and tokens[idx] not in special_tokens:
+                # The usual case: a simple key, followed by either a simple
+                # value or something `member` has to figure out
+                key = tokens[idx]
+                idx += 2
+                if (idx+1 < num_tokens and tokens[idx] not in special_tokens
+                        and tokens[idx+1] in end_tokens):
+                    result[key] = tokens[idx]
+                    idx += 1
+                else:
+                    (result[key], idx) = self.member(idx)
+            else:
+                (item, idx) = self.parse_item(idx)
+                if item[2]:
+                    (key, value) = self.member_value(item)
+                    result[key] = value
+                elif first and member:
+                    (items, close) = self.parse_items(group_start)
+                    return (self.bare_list(items, group_start, close), close+1)
+            first = False
+            if idx < num_tokens and tokens[idx] == ',':
+                idx += 1
+            elif idx < num_tokens:
+                return (result, idx+1)
+            else:
+                return (result, idx)
+
+    def member(self, idx):
+        """
+        Parses the value of a struct member, starting at token `idx`.
+        Returns a tuple of the value and the index of the token after it.
+        """
+        tokens = self.tokens
+        num_tokens = self.num_tokens
+        if idx >= num_tokens:
+            return ('', idx)
+        token = tokens[idx]
+        if token == '(':
+            (value, end) = self.group(idx+1, True)
+            if end >= num_tokens or tokens[end] in end_tokens:
+                return (value, end)
+        elif token in end_tokens:
+            return ('', idx)
+        elif token != '=' and (idx+1 >= num_tokens or tokens[idx+1] in end_tokens):
+            return (token, idx+1)
+        (item, end) = self.parse_item(idx)
+        return (self.value_of(*item, True), end)
+
+    def parse_item(self, idx):
+        """
+        Collects an item, starting at token `idx` and going until we hit a
+        top-level comma, a close paren, or the end of our tokens.  Returns a
+        tuple of the item and the index of the token we stopped at.
+        """
+        tokens = self.tokens
+        num_tokens = self.num_tokens
+        start = idx
+        equals = []
+        groups = []
+        while idx < num_tokens:
+            token = tokens[idx]
+            if token == ',' or token == ')':
+                break
+            elif token == '=':
+                equals.append(idx)
+            elif token == '(':
+                (inner, close) = self.parse_items(idx+1)
+                if close < num_tokens:
+                    close += 1
+                groups.append((idx, close, inner))
+                idx = close
+                continue
+            idx += 1
+        return ((start, idx, equals, groups), idx)
+
+    def parse_items(self, idx):
+        """
+        Collects items starting at token `idx`, until we hit a close paren
+        or the end of our tokens.  Returns a tuple of the list of items and
+        the index of the token we stopped at.
+        """
+        items = []
+        while True:
+            (item, idx) = self.parse_item(idx)
+            items.append(item)
+            if idx < self.num_tokens and self.tokens[idx] == ',':
+                idx += 1
+            else:
+                return (items, idx)
+
+    def value_of(self, start, end, equals, groups, member):
+        """
+        Returns the value of an item (see `parse_item`).  `member` is as in
+        `group`.
+        """
+        if start == end:
+            return ''
+        if len(groups) == 1 and groups[0][0] == start and groups[0][1] == end:
+            return self.group_value(groups[0][2], member)
+        if equals:
+            # Looks like a single-member struct without the parens
+            return {self.text(start, equals[0]): self.text(equals[0]+1, end)}
+        return self.text(start, end)
+
+    def member_value(self, item):
+        """
+        Returns a tuple of the key and value of the struct member `item`
+        """
+        (start, end, equals, groups) = item
+        key_end = equals[0]
+        return (self.text(start, key_end), self.value_of(key_end+1, end,
+            equals[1:],
+            [group for group in groups if group[0] > key_end],
+            True))
+
+    def group_value(self, items, member):
+        """
+        Returns the value of a parenthesized group made up of `items`.
+        `member` is as in `group`.
+        """
+        (start, end, equals, groups) = items[0]
+        if len(items) == 1 and start == end:
+            if member:
+                return ''
+            return {}
+        if self.tokens[start] == '(':
+            return [self.value_of(*item, False) for item in items if item[0] != item[1]]
+        if member and not equals:
+            return self.bare_list(items, start, items[-1][1])
+        return dict(self.member_value(item) for item in items if item[2])
+
+    def parse(self):
+        """
+        Parses our value
+        """
+        if self.num_tokens == 1:
+            return self.value
+        if self.num_tokens and self.tokens[0] == '(':
+            (value, end) = self.group(1, False)
+            if end == self.num_tokens:
+                return value
+        (items, idx) = self.parse_items(0)
+        if idx < self.num_tokens:
+            # A stray close paren; just give back the string
+            return self.value
+        if len(items) == 1:
+            return self.value_of(*items[0], False)
+        if all(item[2] for item in items):
+            # A struct without the parens, whose members are left as strings
+            result = {}
+            for (start, end, equals, groups) in items:
+                result[self.text(start, equals[0])] = self.text(equals[0]+1, end)
+            return result
+        return self.value
+
+def parse_value(value, typed=False):
+    """
+    Parses a property value from a dump into dicts, lists and strings.  If
+    `typed` is `True`, the strings will be decoded into typed values as
+    well (see `decode_value`), and bare lists inside structs are split up
+    into lists.
+    """
+    if typed:
+        return decode_value(ValueParser(value, True).parse())
+    return ValueParser(value).parse()
+
+class LazyStructure(collections.abc.Mapping):
+    """
+    A read-only mapping which looks just like the dict that
+    `Node.get_structure` returns, but which only parses property values
+    when they're asked for.  When created, we just find the names of all
+    the properties in `lines` and where their values are; the first time
+    a property is looked up, its value (or values, for arrays) gets parsed
+    and remembered.  This is a lot quicker for callers which only want a
+    property or two out of a large object.  If `typed` is `True`, values
+    are typed as well (see `decode_value`).
+    """
+
+    def __init__(self, lines, typed=False):
+        self.lines = lines
+        self.typed = typed
+        self.spans = {}
+        self.values = {}
+        match_start = property_start_re.match
+        for (idx, line) in enumerate(lines):
+            match = match_start(line)
+            if match:
+                self.spans.setdefault(match.group(1), []).append(
+                        (idx, match.end(), match.group(2) is not None))
+
+    def __getitem__(self, key):
+        if key in self.values:
+            return self.values[key]
+        main = {}
+        for (idx, start, indexed) in self.spans[key]:
+            value = parse_value(self.lines[idx][start:], self.typed)
+            # Same as `Node.parse_structure`, so we end up with the same
+            # thing even if a property shows up more than once
+            if indexed:
+                if key not in main:
+                    main[key] = []
+                main[key].append(value)
+            else:
+                main[key] = value
+        self.values[key] = main[key]
+        return main[key]
+
+    def __contains__(self, key):
+        return key in self.spans
+
+    def __iter__(self):
+        return iter(self.spans)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __repr__(self):
+        return '<LazyStructure: {} properties, {} parsed>'.format(len(self.spans), len(self.values))
+
+# Path expressions, for picking values out of structures.  A path is a
+# series of member names separated by dots, each of which can be followed
+# by array indexes in square brackets (or `[*]`, for every element), such
+# as `Manufacturers[*].Grades[0].GameStageRequirement.MinGameStage`.
+path_component_re = re.compile(r'([A-Za-z0-9_]+)((?:\[(?:[0-9]+|\*)\])*)\Z')
+path_index_re = re.compile(r'\[([0-9]+|\*)\]')
+
+def compile_path(path):
+    """
+    Compiles the path expression `path` into a tuple of steps, for use with
+    `iter_path`: member names are strings, array indexes are ints, and
+    `[*]` is `None`.  Raises `ValueError` if the path isn't valid.
+    """
+    steps = []
+    for component in path.split('.'):
+        match = path_component_re.match(component)
+        if not match:
+            raise ValueError('Invalid path: {}'.format(path))
+        steps.append(match.group(1))
+        for index in path_index_re.findall(match.group(2)):
+            if index == '*':
+                steps.append(None)
+            else:
+                steps.append(int(index))
+    return tuple(steps)
+
+def iter_path(value, steps, prefix=''):
+    """
+    Follows the compiled path `steps` (from `compile_path`) through the
+    structure `value`, yielding a tuple of the concrete path (with real
+    array indexes in place of any `[*]`s, prefixed by `prefix`) and the
+    value found there, for every value the path matches.  Anything which
+    isn't there (missing members, indexes past the end of an array, or
+    `None` or an empty value partway along the path) is just skipped.
+    """
+    path = prefix
+    for (idx, step) in enumerate(steps):
+        if type(step) == str:
+            try:
+                value = value[step]
+            except (KeyError, TypeError, IndexError):
+                return
+            if path:
+                path = '{}.{}'.format(path, step)
+            else:
+                path = step
+        elif type(value) != list:
+            return
+        elif step is None:
+            rest = steps[idx+1:]
+            for (num, inner) in enumerate(value):
+                yield from iter_path(inner, rest, '{}[{}]'.format(path, num))
+            return
+        elif step < len(value):
+            value = value[step]
+            path = '{}[{}]'.format(path, step)
+        else:
+            return
+    yield (path, value)
@@ -29,8 +29,16 @@
 import os
 import re
 import sys
-import lzma
 import json
+import lzma
+import time
+import array
+import bisect
+import argparse
+import concurrent.futures
+from ftexplorer import dumps
+from ftexplorer import fulltext
+from ftexplorer import index as ftindex
 
 # This script generates an index file which FT/BLCMM Explorer can then use
 # to know what elements should be in its tree, rather than having to load all
@@ -38,101 +46,293 @@ import json
 # the user clicking on an element and the element being drawn, though in
 # practice I haven't been able to actually notice it.
 #
-# Note that this process is quite slow...  We're reading the data line-by-line
-# but still need to know the byte position within the file so that we can find
-# each element, so we can't take advantage of any of Python's inherent
-# optimizations when doing line-based file reads.  Since this is a process
-# intended to only be run by myself whenever/if the data files get updated, I
-# haven't bothered to look into optimizing it.  On my machine it takes a good
-# twelve minutes to generate.
+# This used to be quite slow, since we read the data line-by-line in text mode
+# and asked for the file position before every line.  Now the dumps are read
+# in large binary chunks (see `dumps.scan_objects`), with positions worked out
+# from how much data we've seen, and the files are scanned in parallel across
+# `--jobs` processes (by default, one per CPU).
+#
+# The index is written out both as `index.json.xz` and as `index.bin`, a
+# packed binary format which the app can read without parsing (see
+# `ftexplorer/index.py`).  The app uses whichever is newer.
 #
-# Internally, the index is a dictionary.  The keys are the data filenames (without
-# paths), and the values are a list of lists, where each inner list contains the
-# following elements:
+# Internally, the index is a dictionary with a `version` key (currently 3) and a
+# `files` key.  The `files` dict is keyed by the data filenames (without paths),
+# and each value is a dict with the following keys:
 #
-#   1) A list defining exactly where the item should live in the tree
-#      (its name, basically, but exploded)
-#   2) Start position (uncompressed)
-#   3) Length (uncompressed)
+#   `blocks`: The block table for the file (see `ftexplorer/dumps.py`), as a
+#      list of lists: compressed start, compressed length, uncompressed start,
+#      and uncompressed length.  Files which haven't been converted with
+#      `convert_dumps.py` will just have a single block.
+#   `classes`: A list of the classes of the objects in the file (as found
+#      in each object's `Property dump for object '<Class> <Name>'` header)
+#   `objects`: A list of lists, where each inner list contains the following
+#      elements:
+#
+#      1) A list defining exactly where the item should live in the tree
+#         (its name, basically, but exploded)
+#      2) Start position (uncompressed)
+#      3) Length (uncompressed)
+#      4) Block ID (an index into `blocks`), or -1 if the object doesn't fit
+#         inside a single block
+#      5) Start position within the block (uncompressed)
+#      6) Class ID (an index into `classes`)
+#      7) The separators (`.` or `:`) between the parts of the object's
+#         name, as a string, so that the full name can be put back together
 #
 # (The inner lists should more precisely be tuples, but for Reasons we're just
-# using lists.)
+# using lists.)  Version 1 of the index was just the `files` dict, with the
+# `objects` list as the values and without the block information, and
+# version 2 didn't have the last two elements (or `classes`); the app can
+# still read those formats.
+#
+# The index also gets a manifest of the dump files it was built from (their
+# size, mtime and hash), and the raw results of scanning each file are saved
+# alongside it in `index.scan.json.xz`.  With `--incremental`, only files
+# which have changed since the last run (or are new) get scanned again; the
+# results for everything else come from that scan cache, and files which have
+# gone away are dropped.  The collapsing pass below always runs over the full
+# merged set of objects, so the result is the same as a full run.
+#
+# The binary index also gets a reverse-reference table, listing which objects
+# reference each object (by way of `Class'Package.Object'` references in their
+# data), which `search.py --refs` and `Data.get_referrers` can use.  That's
+# too big to usefully store in the JSON index, so it's only in `index.bin`.
+# The same goes for the table of which top-level properties each object
+# defines, used by `Data.get_objects_with_property`.
+#
+# With `--full-text`, we'll also build a trigram index of all the dump data
+# in `index.text.bin` (see `ftexplorer/fulltext.py`), which `search.py` uses
+# to only look at objects which might match.  That takes another pass over
+# all the data (it's not built incrementally), so it's optional.
 
-out_file = 'index.json.xz'
 min_collapse_count = 2
 
-# Print a warning - everyone Not Me won't actually care about this.
-print()
-print("This utility is only useful if you've updated the resource files with")
-print("new data.  It will update the game index files to reflect the new")
-print("contents, so it's available in the app.")
-print()
-print('Hit Ctrl-C now to exit, or Enter to continue...')
-input()
+scan_cache_name = 'index.scan.json.xz'
+scan_cache_version = 4
+
+games = ['BL2', 'TPS', 'AoDK']
+
+class MalformedDumpError(Exception):
+    """
+    Raised when a dump file can't be decompressed, or doesn't look like a
+    dump
+    """
+
+def scan_file(path):
+    """
+    Scans the dump file at `path`.  Returns a tuple containing the file's
+    hash, its block table, a list of the objects found in it, and the
+    number of seconds the scan took.  Each object is a tuple of the object
+    name, start position, length, the object name split into its parts,
+    the object's class, a sorted list of the (lowercased) names of the
+    objects it references, and a sorted list of the top-level properties
+    it defines.
+    Objects which turn out not to have any data get a `None` in place of
+    their parts (and should be removed from the index, even if another
+    file had already provided them).  Raises `MalformedDumpError` if the
+    file isn't a valid xz file, has no objects, or has anything other
+    than an object at the very start.
+    """
+    start_time = time.time()
+    file_hash = dumps.file_hash(path)
+    objects = []
+    try:
+        blocks = dumps.get_block_table(path)
+        with lzma.open(path, 'rb') as df:
+            for (obj_type, obj_name, start_pos, raw) in dumps.scan_objects(df):
+                if not objects and start_pos != 0:
+                    raise MalformedDumpError('{}: unexpected data before the first object'.format(path))
 
-# Generate indexes for all games.
-for game in ['BL2', 'TPS', 'AoDK']:
+                # Omit any object which doesn't have any actual data
+                lines = raw.split(b'\n', 2)
+                if len(lines) < 2 or b'=== Object properties ===' in lines[1]:
+                    objects.append((obj_name, start_pos, len(raw), None, obj_type, [], []))
+                else:
+                    objects.append((obj_name, start_pos, len(raw), re.split('[:\.]', obj_name), obj_type,
+                        sorted(dumps.get_references(raw)), sorted(dumps.get_property_names(raw))))
+    except (ValueError, EOFError, lzma.LZMAError) as e:
+        raise MalformedDumpError('{}: {}'.format(path, e))
+    if not objects:
+        raise MalformedDumpError('{}: no objects found'.format(path))
 
-    print('Indexing {} Game Data'.format(game))
-    print('----------------------')
+    return (file_hash, blocks, objects, time.time() - start_time)
 
-    game_dir = os.path.join('resources', game, 'dumps')
-    game_index = os.path.join(game_dir, out_file)
+def scan_text(path):
+    """
+    Scans the dump file at `path` for the full-text index.  Returns a
+    tuple containing a list of every object in the file (as tuples of the
+    object class, name, start position and length), a dict of trigrams to
+    arrays of indexes into that list, and the number of seconds the scan
+    took.
+    """
+    start_time = time.time()
+    objects = []
+    postings = {}
+    line_cache = {}
+    with lzma.open(path, 'rb') as df:
+        for (obj_type, obj_name, start_pos, raw) in dumps.scan_objects(df):
+            doc_id = len(objects)
+            objects.append((obj_type, obj_name, start_pos, len(raw)))
+            for trigram in fulltext.get_trigrams(raw, line_cache):
+                if trigram not in postings:
+                    postings[trigram] = array.array('I')
+                postings[trigram].append(doc_id)
+    return (objects, postings, time.time() - start_time)
+
+def read_scan_cache(filename):
+    """
+    Reads the scan results saved by a previous run from `filename`.  Returns
+    a dict keyed by dump filename, whose values are dicts containing the
+    file's `size`, `mtime_ns`, `hash`, `blocks` and `objects`.  Each object
+    is a list of the object name, start position, length, whether or not
+    it has data, its class, the names it references, and the properties
+    it defines.  If there's no
+    usable cache, returns an empty dict.
+    """
+    try:
+        with lzma.open(filename, 'rt') as df:
+            cache = json.load(df)
+    except (OSError, EOFError, ValueError, lzma.LZMAError):
+        return {}
+    if cache.get('version') != scan_cache_version:
+        return {}
+    return cache['files']
+
+def write_scan_cache(filename, files):
+    """
+    Writes out the given scan results (see `read_scan_cache`) to `filename`
+    """
+    with lzma.open(filename, 'wt', preset=1) as df:
+        df.write(json.dumps({'version': scan_cache_version, 'files': files}))
+
+def generate_index(game, data_root='resources', output_dir=None,
+        formats=('json', 'binary'), jobs=None, incremental=False, full_text=False,
+        quiet=False):
+    """
+    Generates the index for the given `game`, whose dumps live in
+    `<data_root>/<game>/dumps`, writing out the index in the given
+    `formats` to `output_dir` (by default, the dumps directory).  Dump
+    files are scanned across `jobs` processes (the default is one per
+    CPU).  If `incremental` is `True`, files which haven't changed since
+    the last run won't be scanned again.  If `full_text` is `True`, the
+    full-text index is built as well.  Progress is printed unless
+    `quiet` is `True`.  Returns `True` if the index was written, or
+    `False` if any dump files were malformed (in which case the errors
+    will have been printed to stderr, and nothing is written).
+    """
+
+    if not quiet:
+        print('Indexing {} Game Data'.format(game))
+        print('----------------------')
+
+    game_dir = os.path.join(data_root, game, 'dumps')
+    if not os.path.isdir(game_dir):
+        print('ERROR: {} does not exist'.format(game_dir), file=sys.stderr)
+        return False
+    if output_dir is None:
+        output_dir = game_dir
+    game_scan_cache = os.path.join(output_dir, scan_cache_name)
 
     collapse_names = {}
     full_collapse_names = set()
 
-    # Loop through files and build the index
-    index = {}
+    # Find the files we're indexing
+    entries = []
     with os.scandir(game_dir) as it:
         for entry in sorted(it, key=lambda e: getattr(e, 'name').lower()):
             if entry.name[-8:] == '.dump.xz' or entry.name[-7:] == '.txt.xz':
-                print('Processing {}'.format(entry.name))
-                with lzma.open(entry.path, 'rt', encoding='latin1') as df:
-                    reading_second_line = False
-                    obj_name = None
-                    begin_pos = df.tell()
-                    line = df.readline()
-                    while line:
-                        match = re.search(r"Property dump for object '\S+ (\S+)' ", line)
-                        if match:
-                            if obj_name:
-                                index[obj_name][2] = begin_pos - index[obj_name][1]
-                            obj_name = match.group(1)
-                            index[obj_name] = [entry.name, begin_pos, 0]
-                            reading_second_line = True
-
-                        elif reading_second_line:
-
-                            reading_second_line = False
-
-                            # Omit any object which doesn't have any actual data
-                            if '=== Object properties ===' in line:
-                                del index[obj_name]
-                                obj_name = None
-
-                            else:
-                                # Split our object name and add it to our data list
-                                main_parts = re.split('[:\.]', obj_name)
-                                index[obj_name].append(main_parts)
-
-                                # Grab info about our top level, for later processing to see if
-                                # it makes sense to do extra splitting on it.
-                                top_name = main_parts[0].lower()
-                                full_collapse_names.add(top_name)
-                                name_parts = top_name.rsplit('_', 1)
-                                if len(name_parts) > 1:
-                                    if name_parts[0] not in collapse_names:
-                                        collapse_names[name_parts[0]] = set()
-                                    collapse_names[name_parts[0]].add(name_parts[1])
-
-                        # Read the next line
-                        begin_pos = df.tell()
-                        line = df.readline()
-
-                    # If we reached the end of file, be sure to 'close out' the last object
-                    if obj_name:
-                        index[obj_name][2] = begin_pos - index[obj_name][1]
+                entries.append(entry)
+
+    # If we're running incrementally, figure out which files we already
+    # have up-to-date scan results for.  Size+mtime is good enough if they
+    # match; otherwise fall back to the hash.
+    prev_scans = {}
+    if incremental:
+        prev_scans = read_scan_cache(game_scan_cache)
+    scans = {}
+    manifest = {}
+    to_scan = []
+    for entry in entries:
+        stat = entry.stat()
+        manifest[entry.name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        prev = prev_scans.get(entry.name)
+        if prev is not None and prev['size'] == stat.st_size and (
+                prev['mtime_ns'] == stat.st_mtime_ns or prev['hash'] == dumps.file_hash(entry.path)):
+            manifest[entry.name]['hash'] = prev['hash']
+            scans[entry.name] = dict(prev, **manifest[entry.name])
+        else:
+            to_scan.append(entry)
+    if incremental and not quiet:
+        removed = len(set(prev_scans.keys()) - set(manifest.keys()))
+        print('Reusing {} unchanged files, scanning {}, dropping {}'.format(
+            len(scans), len(to_scan), removed))
+
+    # Scan whatever needs it
+    start_time = time.time()
+    total_bytes = 0
+    total_objects = 0
+    errors = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(scan_file, entry.path) for entry in to_scan]
+        for (entry, future) in zip(to_scan, futures):
+            try:
+                (file_hash, blocks, objects, elapsed) = future.result()
+            except MalformedDumpError as e:
+                errors.append(str(e))
+                continue
+            if not quiet:
+                print('Processed {} ({} objects, {:.2f}s)'.format(entry.name, len(objects), elapsed))
+            total_bytes += blocks[-1][2] + blocks[-1][3]
+            total_objects += len(objects)
+            manifest[entry.name]['hash'] = file_hash
+            scans[entry.name] = dict(manifest[entry.name],
+                    blocks=[list(block) for block in blocks],
+                    objects=[[obj_name, start_pos, length, main_parts is not None, obj_class, obj_refs, obj_props]
+                        for (obj_name, start_pos, length, main_parts, obj_class, obj_refs, obj_props) in objects])
+    elapsed = time.time() - start_time
+
+    if errors:
+        for error in errors:
+            print('ERROR: Malformed dump {}'.format(error), file=sys.stderr)
+        print('ERROR: Not writing {} index'.format(game), file=sys.stderr)
+        return False
+
+    if to_scan and not quiet:
+        print('Scanned {} files ({:.1f}MB) in {:.2f}s: {:.1f}MB/s, {:.0f} objects/s'.format(
+            len(to_scan),
+            total_bytes/1024/1024,
+            elapsed,
+            total_bytes/1024/1024/elapsed,
+            total_objects/elapsed))
+
+    # Merge the results into our index in the same order we'd have gotten
+    # them processing the files one at a time.  Objects found in more than
+    # one file end up pointing at the last one.
+    index = {}
+    block_tables = {}
+    block_starts = {}
+    for entry in entries:
+        scan = scans[entry.name]
+        block_tables[entry.name] = [tuple(block) for block in scan['blocks']]
+        block_starts[entry.name] = [block[2] for block in scan['blocks']]
+        for (obj_name, start_pos, length, has_data, obj_class, obj_refs, obj_props) in scan['objects']:
+            if not has_data:
+                if obj_name in index:
+                    del index[obj_name]
+                continue
+            main_parts = re.split('[:\.]', obj_name)
+            index[obj_name] = [entry.name, start_pos, length, main_parts, obj_class, obj_refs, obj_props]
+
+            # Grab info about our top level, for later processing to see if
+            # it makes sense to do extra splitting on it.
+            top_name = main_parts[0].lower()
+            full_collapse_names.add(top_name)
+            name_parts = top_name.rsplit('_', 1)
+            if len(name_parts) > 1:
+                if name_parts[0] not in collapse_names:
+                    collapse_names[name_parts[0]] = set()
+                collapse_names[name_parts[0]].add(name_parts[1])
 
     # Filter out any top-level keys which are substrings of another key,
     # or which don't have enough children
@@ -169,18 +369,155 @@ for game in ['BL2', 'TPS', 'AoDK']:
             if name_parts[0].lower() in collapse_names:
                 data[3][:1] = ['{}_*'.format(name_parts[0]), data[3][0]]
 
-    # Transform to a dict with filenames as the key
+    # Transform to a dict with filenames as the key, figuring out which
+    # block each object lives in as we go.
     fname_index = {}
-    for (filename, start_pos, length, parts) in index.values():
+    fname_refs = {}
+    fname_props = {}
+    class_ids = {}
+    for (name, (filename, start_pos, length, parts, obj_class, obj_refs, obj_props)) in index.items():
+        blocks = block_tables[filename]
         if filename not in fname_index:
-            fname_index[filename] = []
-        fname_index[filename].append((parts, start_pos, length))
+            fname_index[filename] = {
+                    'blocks': [list(block) for block in blocks],
+                    'classes': [],
+                    'objects': [],
+                    }
+            fname_refs[filename] = []
+            fname_props[filename] = []
+            class_ids[filename] = {}
+        if obj_class not in class_ids[filename]:
+            class_ids[filename][obj_class] = len(fname_index[filename]['classes'])
+            fname_index[filename]['classes'].append(obj_class)
+        block_id = bisect.bisect_right(block_starts[filename], start_pos) - 1
+        block_offset = start_pos - blocks[block_id][2]
+        if block_offset + length > blocks[block_id][3]:
+            block_id = -1
+            block_offset = start_pos
+        fname_index[filename]['objects'].append((parts, start_pos, length, block_id, block_offset,
+            class_ids[filename][obj_class], ''.join(re.findall('[:\.]', name))))
+        fname_refs[filename].append(obj_refs)
+        fname_props[filename].append(obj_props)
 
     # Write out our index
-    print('Writing index to {}'.format(game_index))
-    with lzma.open(game_index, 'wt') as df:
-        json.dump(fname_index, df)
+    os.makedirs(output_dir, exist_ok=True)
+    if 'json' in formats:
+        game_index = os.path.join(output_dir, ftindex.json_index_name)
+        if not quiet:
+            print('Writing index to {}'.format(game_index))
+        ftindex.write_json_index(game_index, fname_index, manifest)
+    if 'binary' in formats:
+        game_binary_index = os.path.join(output_dir, ftindex.binary_index_name)
+        if not quiet:
+            print('Writing binary index to {}'.format(game_binary_index))
+        ftindex.write_binary_index(game_binary_index, fname_index, manifest, fname_refs, fname_props)
+    write_scan_cache(game_scan_cache, scans)
+
+    # Build the full-text index, if we've been asked to.  Trigrams which
+    # show up in too many objects get stopped, for which we need to know
+    # how many objects there are in total.
+    if full_text:
+        start_time = time.time()
+        total_docs = sum(len(scan['objects']) for scan in scans.values())
+        builder = fulltext.TextIndexBuilder(int(total_docs*fulltext.default_max_fraction))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(scan_text, entry.path) for entry in entries]
+            for (entry, future) in zip(entries, futures):
+                (objects, postings, file_elapsed) = future.result()
+                if not quiet:
+                    print('Processed {} for full-text index ({:.2f}s)'.format(entry.name, file_elapsed))
+                builder.add_file(entry.name, objects, postings)
+        game_text_index = os.path.join(output_dir, fulltext.text_index_name)
+        if not quiet:
+            print('Writing full-text index to {} ({} trigrams, {} stopped, {:.2f}s)'.format(
+                game_text_index, len(builder.postings), len(builder.stopped), time.time() - start_time))
+        builder.write(game_text_index)
+
+    if not quiet:
+        print()
+    return True
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Generate FT-Explorer game data indexes.  This is only useful if '
+            'you\'ve updated the resource files with new data.',
+        )
+
+    parser.add_argument('-g', '--game',
+        action='append',
+        help='Game to index: bl2, tps, or aodk.  Can be specified more than once (default: all)',
+        )
+
+    parser.add_argument('-d', '--data-root',
+        default='resources',
+        help='Directory containing the game data directories (default: %(default)s)',
+        )
+
+    parser.add_argument('-o', '--output',
+        help='Directory to write the index to (default: the game\'s dumps directory).  '
+            'Can only be used when indexing a single game',
+        )
+
+    parser.add_argument('-f', '--format',
+        action='append',
+        choices=['json', 'binary'],
+        help='Index format to write.  Can be specified more than once (default: both)',
+        )
+
+    parser.add_argument('-j', '--jobs',
+        type=int,
+        help='Number of dump files to scan in parallel (default: number of CPUs)',
+        )
+
+    parser.add_argument('-i', '--incremental',
+        action='store_true',
+        default=False,
+        help='Only scan dump files which have changed since the last run',
+        )
+
+    parser.add_argument('-t', '--full-text',
+        action='store_true',
+        default=False,
+        help='Also build the full-text index used to speed up search.py',
+        )
+
+    parser.add_argument('-q', '--quiet',
+        action='store_true',
+        default=False,
+        help='Don\'t print anything other than errors',
+        )
+
+    args = parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+
+    to_index = []
+    for game in args.game or games:
+        for real_game in games:
+            if game.lower() == real_game.lower():
+                if real_game not in to_index:
+                    to_index.append(real_game)
+                break
+        else:
+            parser.error('invalid game: {}'.format(game))
+    if args.output is not None and len(to_index) > 1:
+        parser.error('--output can only be used with a single --game')
 
-    print()
+    # Generate indexes for all the games we've been asked for
+    success = True
+    for game in to_index:
+        if not generate_index(game,
+                data_root=args.data_root,
+                output_dir=args.output,
+                formats=args.format or ['json', 'binary'],
+                jobs=args.jobs,
+                incremental=args.incremental,
+                full_text=args.full_text,
+                quiet=args.quiet):
+            success = False
 
-print('Done!')
+    if not success:
+        sys.exit(1)
+    if not args.quiet:
+        print('Done!')
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+
+# Benchmarks how long it takes to construct a Data object for each game, and
+# how much memory it takes, using both the JSON and the binary index.  For
+# comparison, the `legacy` rows build the old-style tree of `Node` objects
+# (one per path component, each with its own `children` dict) from the JSON
+# index, the way Data used to.  Each measurement is done in a fresh process
+# so they don't affect each other.  "RSS" is resident memory once we're
+# done and have garbage-collected; "Peak" is the high-water mark.
+#
+# If a game doesn't have a binary index yet, pass `--convert` to generate
+# one from its JSON index.  (Data does that itself the first time it loads
+# a game with only a JSON index, unless it's been told which format to
+# use, as we do here.)  (Linux/Mac only, since we're using the
+# `resource` module for memory stats.)
+
+import gc
+import os
+import sys
+import time
+import resource
+import subprocess
+from ftexplorer import index
+from ftexplorer.data import Data, Node
+
+games = ['BL2', 'TPS', 'AoDK']
+formats = ['legacy', 'json', 'binary']
+
+def get_rss():
+    """
+    Returns a tuple of our current and peak resident memory, in KiB.  On
+    Linux we use /proc, since ru_maxrss is carried over across exec() from
+    our parent process.
+    """
+    if os.path.exists('/proc/self/status'):
+        stats = {}
+        with open('/proc/self/status') as df:
+            for line in df:
+                if line.startswith('VmRSS:') or line.startswith('VmHWM:'):
+                    stats[line[:5]] = int(line.split()[1])
+        return (stats['VmRSS'], stats['VmHWM'])
+    # ru_maxrss is in KiB on Linux, bytes on Mac
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+    return (rss, rss)
+
+def build_legacy_tree(game):
+    """
+    Builds a tree of `Node` objects from the JSON index, as Data did
+    before it switched to `NodeStore`.
+    """
+    top = Node('')
+    index_file = os.path.join('resources', game, 'dumps', index.json_index_name)
+    for (filename, filename_data) in index.read_json_index(index_file).items():
+        for (parts, pos_start, length, block_id, block_offset, class_id, seps) in filename_data['objects']:
+            top.start_data(parts,
+                    game=game,
+                    filename=filename,
+                    pos_start=pos_start,
+                    length=length)
+    return top
+
+if len(sys.argv) == 4 and sys.argv[1] == '--child':
+    game = sys.argv[2]
+    index_format = sys.argv[3]
+    start = time.perf_counter()
+    if index_format == 'legacy':
+        data = build_legacy_tree(game)
+    else:
+        data = Data(game, index_format=index_format)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    (rss, peak) = get_rss()
+    print('{} {} {}'.format(elapsed, rss, peak))
+    sys.exit(0)
+
+if '--convert' in sys.argv:
+    for game in games:
+        game_dir = os.path.join('resources', game, 'dumps')
+        json_index = os.path.join(game_dir, index.json_index_name)
+        binary_index = os.path.join(game_dir, index.binary_index_name)
+        if os.path.exists(json_index) and not os.path.exists(binary_index):
+            print('Generating {}'.format(binary_index))
+            index.write_binary_index(binary_index, index.read_json_index(json_index))
+
+print('{:<6} {:<8} {:>10} {:>10} {:>10}'.format('Game', 'Format', 'Time (s)', 'RSS (MiB)', 'Peak (MiB)'))
+for game in games:
+    for index_format in formats:
+        index_name = index.index_names.get(index_format, index.json_index_name)
+        if not os.path.exists(os.path.join('resources', game, 'dumps', index_name)):
+            print('{:<6} {:<8} {:>10} {:>10} {:>10}'.format(game, index_format, '-', '-', '-'))
+            continue
+        output = subprocess.check_output([sys.executable, sys.argv[0], '--child', game, index_format])
+        (elapsed, rss, peak) = output.decode('utf-8').split()
+        print('{:<6} {:<8} {:>10.2f} {:>10.1f} {:>10.1f}'.format(game, index_format,
+            float(elapsed), int(rss)/1024, int(peak)/1024))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+
+# Benchmarks the property value parser in `ftexplorer/structure.py` against
+# the old `Node.parse_data_value` (from `parser_differential.py`).  All the
+# property values from the given dump files are read into memory first, so
+# we're only timing the parsing itself.  By default we use a few of the
+# classes with the biggest and most deeply-nested values.  The new parser is
+# timed with typed values (see `structure.decode_value`) as well.
+
+import sys
+import time
+import argparse
+from ftexplorer import dumps
+from ftexplorer import structure
+from ftexplorer.data import Data
+from parser_differential import old_parse_data_value
+
+default_types = ['BehaviorProviderDefinition', 'AIBehaviorProviderDefinition',
+        'WillowAIPawn', 'AIPawnBalanceDefinition']
+
+parser = argparse.ArgumentParser(
+    description='Benchmark the property value parser',
+    )
+parser.add_argument('-g', '--game',
+    choices=['BL2', 'TPS', 'AoDK'],
+    default='BL2',
+    help='Game to use (default: %(default)s)',
+    )
+parser.add_argument('-t', '--type',
+    action='append',
+    help='Object type (dump file) to use.  Can be specified more than once (default: {})'.format(
+        ', '.join(default_types)),
+    )
+parser.add_argument('-r', '--rounds',
+    type=int,
+    default=3,
+    help='Number of times to time each parser; the best time is reported (default: %(default)s)',
+    )
+args = parser.parse_args()
+
+data = Data(args.game)
+values = []
+for obj_type in args.type or default_types:
+    try:
+        with data.open_dump('{}.dump.xz'.format(obj_type)) as df:
+            for (found_type, obj_name, pos_start, raw) in dumps.scan_objects(df):
+                for line in str(raw, 'latin1').splitlines():
+                    match = structure.property_line_re.match(line)
+                    if match:
+                        values.append(match.group(4))
+    except FileNotFoundError:
+        print('Skipping {}: no dump file'.format(obj_type), file=sys.stderr)
+if not values:
+    print('No values found!', file=sys.stderr)
+    sys.exit(1)
+total_mb = sum(len(value) for value in values)/1024/1024
+print('{} values, {:.1f}MB'.format(len(values), total_mb))
+
+results = {}
+for (label, func) in [
+        ('old', old_parse_data_value),
+        ('new', structure.parse_value),
+        ('typed', lambda value: structure.parse_value(value, True)),
+        ]:
+    best = None
+    for num in range(args.rounds):
+        start_time = time.perf_counter()
+        for value in values:
+            func(value)
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    results[label] = best
+    print('{}: {:.2f}s, {:.2f}MB/s, {:.0f} values/s'.format(label, best, total_mb/best, len(values)/best))
+print('Speedup: {:.1f}x'.format(results['old']/results['new']))
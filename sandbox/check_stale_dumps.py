@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+
+# Checks that Data copes with a dump file which has changed since the index
+# was generated (see `Data.check_files`).  We set up a copy of a game's data
+# in a temporary directory (symlinking all the dump files except the one we
+# change), give it an index with a manifest of the unchanged files, and then
+# append a new object to one of the dumps.  `Data.iter_type` should then
+# yield the new object along with all the old ones, both with and without
+# `retain`, the old objects should still load from wherever they are now,
+# and the file should be reported as stale.  Prints `OK` if all's well;
+# otherwise an assertion fails.
+
+import os
+import lzma
+import argparse
+import tempfile
+from ftexplorer import dumps
+from ftexplorer import index
+from ftexplorer.data import Data
+
+parser = argparse.ArgumentParser(
+    description='Check that Data copes with dump files changed after indexing',
+    )
+
+parser.add_argument('game',
+    nargs='?',
+    default='AoDK',
+    help='Which game to use (default: AoDK)',
+    )
+
+parser.add_argument('obj_type',
+    nargs='?',
+    default='ItemPoolDefinition',
+    help='Which dump file to change (default: ItemPoolDefinition)',
+    )
+
+args = parser.parse_args()
+
+game_dir = os.path.abspath(os.path.join('resources', args.game, 'dumps'))
+dump_name = '{}.dump.xz'.format(args.obj_type)
+new_name = 'GD_StaleCheck.Pools.Pool_Added'
+new_object = ("*** Property dump for object '{} {}' ***\n"
+        "=== {} properties ===\n"
+        "  bAutoReadyItems=True\n"
+        "  MinGameStageRequirement=None\n"
+        "\n").format(args.obj_type, new_name, args.obj_type)
+
+with tempfile.TemporaryDirectory() as temp_dir:
+
+    # Link in the game's dumps, and write out an index with a manifest
+    temp_game_dir = os.path.join(temp_dir, 'resources', args.game, 'dumps')
+    os.makedirs(temp_game_dir)
+    with os.scandir(game_dir) as it:
+        for entry in it:
+            if entry.name[-8:] == '.dump.xz' or entry.name[-7:] == '.txt.xz':
+                os.symlink(entry.path, os.path.join(temp_game_dir, entry.name))
+    files = index.read_json_index(os.path.join(game_dir, index.json_index_name))
+    manifest = {}
+    for filename in files.keys():
+        path = os.path.join(game_dir, filename)
+        stat = os.stat(path)
+        manifest[filename] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': dumps.file_hash(path)}
+    index.write_json_index(os.path.join(temp_game_dir, index.json_index_name), files, manifest)
+
+    # Now add an object to the end of our chosen dump, keeping track of
+    # what was in there to start with
+    temp_dump = os.path.join(temp_game_dir, dump_name)
+    os.remove(temp_dump)
+    with lzma.open(os.path.join(game_dir, dump_name), 'rb') as df:
+        names = [obj_name for (obj_type, obj_name, pos_start, obj_raw) in dumps.scan_objects(df)]
+    with lzma.open(os.path.join(game_dir, dump_name), 'rb') as df:
+        raw = df.read()
+    with lzma.open(temp_dump, 'wb') as df:
+        df.write(raw)
+        df.write(new_object.encode('latin1'))
+
+    cwd = os.getcwd()
+    os.chdir(temp_dir)
+    try:
+        data = Data(args.game, index_format='json')
+        assert dump_name in data.check_files(), 'changed dump not suspect'
+        for retain in [False, True]:
+            found = {}
+            for (name, node) in data.iter_type(args.obj_type, retain=retain):
+                found[name] = node
+            assert new_name in found, 'added object not found (retain={})'.format(retain)
+            assert found[new_name].get_structure()['bAutoReadyItems'] == 'True'
+            assert set(found.keys()) == set(names) | set([new_name])
+        data.close()
+
+        # A fresh Data, so that the old objects get loaded via the index
+        data = Data(args.game, index_format='json')
+        for name in names:
+            node = data.get_node_by_full_object(name)
+            assert node.get_structure() == found[name].get_structure(), '{} loads differently'.format(name)
+        assert data.get_stale_files() == [dump_name], 'changed dump not stale'
+        data.close()
+    finally:
+        os.chdir(cwd)
+
+print('OK')
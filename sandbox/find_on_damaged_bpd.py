@@ -8,8 +8,8 @@ from ftexplorer.data import Data
 data = Data('BL2')
 
 objects = []
-objects.extend(data.get_all_by_type('AIBehaviorProviderDefinition'))
-objects.extend(data.get_all_by_type('BehaviorProviderDefinition'))
+objects.extend(data.get_objects_with_property('BehaviorSequences', 'AIBehaviorProviderDefinition'))
+objects.extend(data.get_objects_with_property('BehaviorSequences', 'BehaviorProviderDefinition'))
 
 found_event_names = {}
 
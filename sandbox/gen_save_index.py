@@ -15,7 +15,7 @@ data = Data(game)
 locations = {}
 for obj_type in ['FastTravelStationDefinition', 'LevelTravelStationDefinition']:
     for obj_name in data.get_all_by_type(obj_type):
-        obj_struct = data.get_struct_by_full_object(obj_name)
+        obj_struct = data.get_struct_by_full_object(obj_name, lazy=True)
         (_, identifier) = obj_name.rsplit('.', 1)
         if obj_struct['StationLevelName'] != 'None':
             if run_station_check and identifier.lower() in locations:
@@ -33,7 +33,7 @@ if run_station_check:
 # Get a list of mission objects to names
 missions = {}
 for obj_name in data.get_all_by_type('MissionDefinition'):
-    obj_struct = data.get_struct_by_full_object(obj_name)
+    obj_struct = data.get_struct_by_full_object(obj_name, lazy=True)
     missions[obj_name.lower()] = obj_struct['MissionName']
 
 # Flip our data level dict so we can go from level ID to name
@@ -6,27 +6,9 @@ import sys
 from ftexplorer.data import Data
 
 data = Data('BL2')
-baldef_names = data.get_all_by_type('InventoryBalanceDefinition') + \
-        data.get_all_by_type('WeaponBalanceDefinition')
+results = data.query(['InventoryBalanceDefinition', 'WeaponBalanceDefinition'],
+        'Manufacturers[*].Grades[*].GameStageRequirement.MinGameStage',
+        where=lambda min_stage: int(min_stage) > 1)
 
-for baldef_name in sorted(baldef_names):
-    baldef = data.get_struct_by_full_object(baldef_name)
-    if ('Manufacturers' in baldef and
-            baldef['Manufacturers'] is not None and
-            baldef['Manufacturers'] != ''):
-        for (man_idx, man) in enumerate(baldef['Manufacturers']):
-            if ('Grades' in man and
-                    man['Grades'] is not None and
-                    man['Grades'] != ''):
-                for (grade_idx, grade) in enumerate(man['Grades']):
-                    if ('GameStageRequirement' in grade and
-                            grade['GameStageRequirement'] is not None and
-                            grade['GameStageRequirement'] != ''):
-                        req = grade['GameStageRequirement']
-                        min_stage = req['MinGameStage']
-                        if int(min_stage) > 1:
-                            print('set {} Manufacturers[{}].Grades[{}].GameStageRequirement.MinGameStage 1'.format(
-                                baldef_name,
-                                man_idx,
-                                grade_idx,
-                                ))
+for (baldef_name, path, min_stage) in sorted(results, key=lambda result: result[0]):
+    print('set {} {} 1'.format(baldef_name, path))
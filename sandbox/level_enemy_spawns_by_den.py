@@ -9,35 +9,38 @@ levels = [
         ('Cortex', 'Ma_SubBoss_P'),
     ]
 
-popdef_cache = {}
 def get_spawns_from_popdef(popdef_name, data):
 
-    global popdef_cache
-    if popdef_name in popdef_cache:
-        return popdef_cache[popdef_name]
-
     popdef_set = set()
-    popdef_struct = data.get_node_by_full_object(popdef_name).get_structure()
-    for archetype in popdef_struct['ActorArchetypeList']:
-        if archetype['SpawnFactory'] != 'None':
-            spawnfactory_name = archetype['SpawnFactory'].split("'", 2)[1]
-            sf_struct = data.get_node_by_full_object(spawnfactory_name).get_structure()
-            if 'PawnBalanceDefinition' in sf_struct:
-                if sf_struct['PawnBalanceDefinition'] != 'None':
-                    popdef_set.add(sf_struct['PawnBalanceDefinition'].split("'", 2)[1])
-            elif 'PopulationDef' in sf_struct:
-                new_popdef_name = sf_struct['PopulationDef'].split("'", 2)[1]
-                popdef_set = popdef_set.union(get_spawns_from_popdef(new_popdef_name, data))
-            elif 'WillowAIPawnArchetype' in sf_struct:
-                popdef_set.add(sf_struct['WillowAIPawnArchetype'].split("'", 2)[1])
-            elif 'VehicleArchetype' in sf_struct:
-                popdef_set.add(sf_struct['VehicleArchetype'].split("'", 2)[1])
-            elif 'ObjectBalanceDefinition' in sf_struct:
-                pass
-            else:
-                raise Exception('Not sure what to do: {}'.format(spawnfactory_name))
 
-    popdef_cache[popdef_name] = popdef_set
+    def visit(obj_name, obj_struct, depth):
+        """
+        Popdefs get followed through to their spawn factories, and spawn
+        factories which point at another popdef get followed through to
+        that.  Any other spawn factory is an end point.
+        """
+        if 'ActorArchetypeList' in obj_struct:
+            return True
+        elif 'PawnBalanceDefinition' in obj_struct:
+            if obj_struct['PawnBalanceDefinition'] is not None:
+                popdef_set.add(obj_struct['PawnBalanceDefinition'].name)
+        elif 'PopulationDef' in obj_struct:
+            return True
+        elif 'WillowAIPawnArchetype' in obj_struct:
+            popdef_set.add(obj_struct['WillowAIPawnArchetype'].name)
+        elif 'VehicleArchetype' in obj_struct:
+            popdef_set.add(obj_struct['VehicleArchetype'].name)
+        elif 'ObjectBalanceDefinition' in obj_struct:
+            pass
+        else:
+            raise Exception('Not sure what to do: {}'.format(obj_name))
+        return False
+
+    for result in data.walk(popdef_name,
+            ['ActorArchetypeList[*].SpawnFactory', 'PopulationDef'],
+            visit=visit,
+            typed=True):
+        pass
     return popdef_set
 
 pawnbalance_cache = {}
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+
+# Differential test for the property value parser in `ftexplorer/structure.py`:
+# parses every property value of every object in the given games (by default,
+# all of them) with both the new parser and the old `Node.parse_data_value`
+# (copied below, verbatim), and reports where they differ.  The new parser
+# is supposed to agree with the old one everywhere the old one got things
+# right, so each difference is sorted into one of the known ways the old
+# one goes wrong, and anything else is reported as `unexplained`:
+#
+#   `quoted`: The value has a quoted string containing a comma, paren or
+#      equals sign, which the old parser didn't protect
+#   `nested`: A struct nested inside another struct, which the old parser
+#      didn't parse (it split it on commas, or left it as a string)
+#   `list`: A list of structs as a top-level value, which the old parser
+#      mangled
+#   `prefixed`: A struct member like `Foo=Bar(...)`, where the old parser
+#      threw away the `Bar` and parsed the parens as a struct
+#   `error`: The old parser raised an exception (usually on a string with
+#      an equals sign in it, like the HTML in some skill descriptions)
+#   `truncated`: A struct which never gets closed, because the line got cut
+#      short when the object was split into lines (a few strings contain
+#      characters that `splitlines()` treats as line breaks)
+#
+# Differences only get sorted into those categories if the new parser's
+# result can be written back out into the original value (ignoring parens,
+# which aren't always kept), so we know that it didn't lose anything, and
+# if none of the strings in it have an unquoted struct left inside.
+#
+# A few examples of each are printed.  Exits with a nonzero status if there
+# were any unexplained differences.
+
+import re
+import sys
+import argparse
+import collections
+from ftexplorer import dumps
+from ftexplorer import structure
+from ftexplorer.data import Data
+
+games = ['BL2', 'TPS', 'AoDK']
+
+def write_value(parsed):
+    """
+    Writes out a parsed value back into text (without any parens)
+    """
+    if type(parsed) == dict:
+        return ','.join('{}={}'.format(key, write_value(value)) for (key, value) in parsed.items())
+    elif type(parsed) == list:
+        return ','.join(write_value(value) for value in parsed)
+    return parsed
+
+def get_leaves(parsed):
+    """
+    Yields all the strings inside a parsed value
+    """
+    if type(parsed) == dict:
+        for value in parsed.values():
+            yield from get_leaves(value)
+    elif type(parsed) == list:
+        for value in parsed:
+            yield from get_leaves(value)
+    else:
+        yield parsed
+
+def strip_value(value):
+    """
+    Strips the parens out of a value, plus any empty items left behind
+    """
+    value = value.replace('(', '').replace(')', '')
+    while ',,' in value:
+        value = value.replace(',,', ',')
+    return value.strip(',')
+
+def classify(value):
+    """
+    Returns our best guess as to why the old parser got `value` wrong
+    """
+    if value.startswith('(') and not value.endswith(')'):
+        return 'truncated'
+    parsed = structure.parse_value(value)
+    if strip_value(write_value(parsed)) != strip_value(value):
+        return 'unexplained'
+    for leaf in get_leaves(parsed):
+        unquoted = re.sub(r'"[^"]*"', '', leaf)
+        if '(' in unquoted and '=' in unquoted:
+            return 'unexplained'
+    try:
+        old_parse_data_value(value)
+    except Exception:
+        return 'error'
+    tokens = structure.token_re.findall(value)
+    for token in tokens:
+        if len(token) > 1 and token[0] == '"' and any(char in token for char in '(),='):
+            return 'quoted'
+    if value.startswith('((') and value.endswith('))'):
+        return 'list'
+    depth = 0
+    max_depth = 0
+    for token in tokens:
+        if token == '(':
+            depth += 1
+            max_depth = max(max_depth, depth)
+        elif token == ')':
+            depth -= 1
+    if max_depth >= 3 or (max_depth == 2 and not value.startswith('(')):
+        return 'nested'
+    for (prev, token) in zip(tokens, tokens[1:]):
+        if token == '(' and prev not in structure.special_tokens:
+            return 'prefixed'
+    # Single-member nested structs show up as `(Foo=(Bar=1))` at depth two
+    if max_depth == 2 and '=(' in value and not '=((' in value:
+        return 'nested'
+    return 'unexplained'
+
+def old_parse_data_value(value):
+    """
+    Parses a structure inside our data - basically a property value,
+    but also any "sub" value that's inside parens in there.  This is
+    *highly* inefficient the way it's currently written -- those
+    parenthetical statements end up getting looped over multiple times
+    throughout here.  The code is also fairly laughable, so sorry about
+    that.  This isn't actually used by the GUI (thankfully).  It's
+    just here to support some data-inspection scripts.  Note that in
+    the event we get some data I didn't plan for, this function could
+    raise an Exception.
+
+    Note that this does NOT properly deal with quotes - if you have
+    something quoted which happens to have a comma in it, for instance,
+    things will probably go awry.
+    """
+    #print('parsing: {}'.format(value))
+    if len(value) == 0:
+        return value
+    elif value[0] == '(' and value[-1] == ')':
+        newdict = {}
+        cur_level = 0
+        cur_key = []
+        cur_value = []
+        cur_inner = []
+        state = 0
+        first_key_pass = False
+        for char in value[1:-1]:
+
+            # State 0 - reading key
+            if state == 0:
+                if char == '=':
+                    state = 1
+                elif first_key_pass and char == ',':
+                    pass
+                else:
+                    cur_key.append(char)
+                first_key_pass = False
+
+            # State 1 - reading value
+            elif state == 1:
+                if char == ',':
+                    newdict[''.join(cur_key)] = old_parse_data_value(''.join(cur_value))
+                    cur_key = []
+                    cur_value = []
+                    cur_inner = []
+                    first_key_pass = True
+                    state = 0
+                elif char == '(':
+                    cur_level += 1
+                    cur_inner.append(char)
+                    state = 2
+                else:
+                    cur_value.append(char)
+
+            # State 2 - Reading first char of an inner paren stanza
+            elif state == 2:
+                if char == '(':
+                    newdict[''.join(cur_key)] = []
+                    state = 4
+                    at_first = True
+                else:
+                    state = 3
+
+            # State 3 - reading a regular inner dict
+            if state == 3:
+                if char == '(':
+                    cur_level += 1
+                elif char == ')':
+                    cur_level -= 1
+                cur_inner.append(char)
+                if cur_level == 0:
+                    newdict[''.join(cur_key)] = old_parse_data_value(''.join(cur_inner[1:-1]))
+                    cur_key = []
+                    cur_value = []
+                    cur_inner = []
+                    first_key_pass = True
+                    state = 0
+
+            # State 4 - Reading a list
+            elif state == 4:
+                if char == '(':
+                    cur_level += 1
+                    if not at_first:
+                        cur_inner.append(char)
+                elif char == ')':
+                    cur_level -= 1
+                    cur_inner.append(char)
+
+                    if cur_level == 1:
+                        newdict[''.join(cur_key)].append(old_parse_data_value(''.join(cur_inner)))
+                        cur_inner = []
+
+                    elif cur_level == 0:
+                        cur_key = []
+                        cur_value = []
+                        cur_inner = []
+                        first_key_pass = True
+                        state = 0
+
+                elif cur_level == 1 and char == ',':
+                    pass
+
+                else:
+                    cur_inner.append(char)
+
+                at_first = False
+
+        # Clean up, depending on our state
+        if state == 0:
+            pass
+        elif state == 1:
+            newdict[''.join(cur_key)] = old_parse_data_value(''.join(cur_value))
+        else:
+            raise Exception("shouldn't be able to get here")
+
+        return newdict
+    else:
+
+        # Check for quoted values, and don't split commas inside them.
+        # Also don't try to parse mismatched quotes.  We're just being
+        # even more stupid about it and converting commas in quotes to
+        # unicode snowmen, temporarily
+        new_value = value
+        replace_comma = u"\u2603"
+        quote_parts = value.split('"')
+        if len(quote_parts) > 1 and len(quote_parts) % 2 == 1:
+            new_val_list = []
+            for (idx, part) in enumerate(quote_parts):
+                if idx % 2 == 1:
+                    new_val_list.append(part.replace(',', replace_comma))
+                else:
+                    new_val_list.append(part)
+            new_value = '"'.join(new_val_list)
+
+        parts = [p.replace(replace_comma, ',') for p in new_value.split(',')]
+        if len(parts) == 1:
+            # See the comment on the other side of the `if` here.  We may have
+            # a single-element dict.
+            if '=' in value:
+                newdict = {}
+                (key, val) = value.split('=', 1)
+                newdict[key] = val
+                return newdict
+            else:
+                return value
+        else:
+            # This is hokey, and a byproduct of the stupid way we're parsing
+            # this stuff (and is susceptible to corner cases) - anyway, at
+            # this point we MAY have a dict, or we may just have a string
+            # which happens to have a comma in it.  We'll just test the first
+            # element and see if there's an equals sign in it.  If it does,
+            # then we'll parse it as a dict.  If not, just return as a string.
+            if '=' in parts[0]:
+                newdict = {}
+                for part in parts:
+                    (key, val) = part.split('=', 1)
+                    newdict[key] = val
+                return newdict
+            else:
+                return value
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Compare the new property value parser against the old one',
+        )
+    parser.add_argument('-g', '--game',
+        action='append',
+        choices=games,
+        help='Game to check (default: all)',
+        )
+    parser.add_argument('-e', '--examples',
+        type=int,
+        default=3,
+        help='Number of examples of each kind of difference to print (default: %(default)s)',
+        )
+    args = parser.parse_args()
+
+    total_values = 0
+    differences = collections.Counter()
+    examples = {}
+    for game in args.game or games:
+        data = Data(game)
+        game_values = 0
+        for filename in data.store.filenames:
+            with data.open_dump(filename) as df:
+                for (obj_type, obj_name, pos_start, raw) in dumps.scan_objects(df):
+                    for line in str(raw, 'latin1').splitlines():
+                        match = structure.property_line_re.match(line)
+                        if not match:
+                            continue
+                        value = match.group(4)
+                        game_values += 1
+                        try:
+                            old = old_parse_data_value(value)
+                        except Exception as e:
+                            old = e
+                        if structure.parse_value(value) != old:
+                            kind = classify(value)
+                            differences[kind] += 1
+                            examples.setdefault(kind, []).append((obj_name, line.strip()))
+        print('{}: {} values checked'.format(game, game_values))
+        total_values += game_values
+        data.close()
+
+    print('Total: {} values, {} differences'.format(total_values, sum(differences.values())))
+    for (kind, count) in sorted(differences.items()):
+        print('')
+        print('{}: {}'.format(kind, count))
+        for (obj_name, line) in examples[kind][:args.examples]:
+            if len(line) > 200:
+                line = '{}...'.format(line[:200])
+            print('  {}: {}'.format(obj_name, line))
+
+    if differences['unexplained']:
+        sys.exit(1)
@@ -29,14 +29,20 @@
 # The main app doesn't have a search, of course.  But at the moment,
 # FT's TPS data is a bit anemic, and BLCMM's TPS data is entirely
 # nonexistant, and it'd be nice to be able to search.  So, this'll
-# do that.  Expect it to be slow.
+# do that.  Expect it to be slow, except for `--refs` searches when the
+# game's binary index has a reverse-reference table (see
+# `generate_indexes.py`), which are answered straight from that, or when
+# the game has a full-text index (`generate_indexes.py --full-text`), in
+# which case we only need to look at objects which might match.
 
 import os
-import re
 import sys
 import lzma
 import colorama
 import argparse
+from ftexplorer import dumps
+from ftexplorer import fulltext
+from ftexplorer.data import Data
 
 parser = argparse.ArgumentParser(
     description='Search through FT-Explorer\'s BL2/TPS/AoDK data',
@@ -103,28 +109,95 @@ else:
 # next-char values which will trigger ignoreself
 ignorechars = set([':', '.'])
 
+def is_ignored(obj_name):
+    """
+    Returns `True` if we've been told to ignore the object `obj_name`
+    """
+    if args.ignoreself and obj_name.lower().startswith(ignore_search_str):
+        if len(obj_name) > len(ignore_search_str):
+            if obj_name[len(ignore_search_str)] in ignorechars:
+                return True
+        else:
+            return True
+    return False
+
+def search_dump(path):
+    """
+    Searches through every object in the dump file at `path`, printing out
+    the ones which match
+    """
+    with lzma.open(path, 'rb') as df:
+        for (cur_type, cur_obj, pos_start, raw) in dumps.scan_objects(df):
+            if is_ignored(cur_obj):
+                continue
+            if search_str in str(raw, 'latin1').lower():
+                print("{}{}{}'{}'".format(color_type, cur_type, color_obj, cur_obj))
+
+def report_changed(changed):
+    """
+    Lets the user know that the dump files in `changed` are newer than the
+    game's index, so we'll be searching through them directly
+    """
+    print('NOTE: {} dump file(s) have changed since the index was generated; searching them directly'.format(
+        len(changed)), file=sys.stderr)
+
+# If we're searching for references, and the game has a binary index with a
+# reverse-reference table, we can answer straight from that, so long as none
+# of the dump files have changed since the index was generated.
+data = None
+changed = set()
+if args.refs:
+    try:
+        data = Data(game, index_format='binary')
+    except FileNotFoundError:
+        data = None
+    if data is not None and data.store.tree.has_refs:
+        changed = data.get_changed_files()
+        if not changed:
+            nodes = [data.get_node_by_full_object(name) for name in data.get_referrers(args.searchstr)]
+            for node in sorted(nodes, key=lambda n: (n.filename.lower(), n.pos_start)):
+                cur_obj = data.store.get_full_name(node.node_id)
+                if not is_ignored(cur_obj):
+                    print("{}{}{}'{}'".format(color_type, node.obj_class, color_obj, cur_obj))
+            sys.exit(0)
+
+# If we have a full-text index, use it to narrow down which objects we need
+# to look at.  We still have to check each candidate, since the index can
+# only tell us which objects have all the trigrams of the search string.
+# Dump files which have changed since the index was generated get searched
+# in full instead.
+game_dir = os.path.join('resources', game, 'dumps')
+try:
+    text_index = fulltext.TextIndex(os.path.join(game_dir, fulltext.text_index_name))
+except FileNotFoundError:
+    text_index = None
+if text_index is not None:
+    candidates = text_index.get_candidates(search_str)
+    if candidates is not None:
+        if data is None:
+            try:
+                data = Data(game, index_format='binary')
+            except FileNotFoundError:
+                data = Data(game)
+        changed = data.get_changed_files()
+        if changed:
+            report_changed(changed)
+        reader = dumps.DumpReader()
+        for doc_id in candidates:
+            (filename, pos_start, length, cur_type, cur_obj) = text_index.get_doc(doc_id)
+            if filename in changed or is_ignored(cur_obj):
+                continue
+            raw = reader.read(os.path.join(game_dir, filename), pos_start, length)
+            if search_str in str(raw, 'latin1').lower():
+                print("{}{}{}'{}'".format(color_type, cur_type, color_obj, cur_obj))
+        for filename in sorted(changed, key=str.lower):
+            search_dump(os.path.join(game_dir, filename))
+        sys.exit(0)
+
 # Loop through and search
-with os.scandir(os.path.join('resources', game, 'dumps')) as it:
+if data is not None and changed:
+    report_changed(changed)
+with os.scandir(game_dir) as it:
     for entry in sorted(it, key=lambda e: getattr(e, 'name').lower()):
         if entry.name[-8:] == '.dump.xz' or entry.name[-7:] == '.txt.xz':
-            with lzma.open(entry.path, 'rt', encoding='latin1') as df:
-                cur_obj = None
-                cur_type = None
-                found_result = False
-                for line in df.readlines():
-                    match = re.search('\*\*\* Property dump for object \'(\S+) (\S+?)\' \*\*\*', line)
-                    if match:
-                        cur_type = match.group(1)
-                        cur_obj = match.group(2)
-                        if args.ignoreself and cur_obj.lower().startswith(ignore_search_str):
-                            if len(cur_obj) > len(ignore_search_str):
-                                if cur_obj[len(ignore_search_str)] in ignorechars:
-                                    cur_type = None
-                                    cur_obj = None
-                            else:
-                                cur_type = None
-                                cur_obj = None
-                        found_result = False
-                    if not found_result and cur_obj and cur_type and search_str in line.lower():
-                        found_result = True
-                        print("{}{}{}'{}'".format(color_type, cur_type, color_obj, cur_obj))
+            search_dump(entry.path)
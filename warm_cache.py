@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# vim: set expandtab tabstop=4 shiftwidth=4:
+
+# Copyright (c) 2018-2021, CJ Kucera
+# All rights reserved.
+#   
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the development team nor the
+#       names of its contributors may be used to endorse or promote products
+#       derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL CJ KUCERA BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Pre-populates an uncompressed dump cache (as used by `Data(game,
+# cache_dir=...)`), so that the first object loaded from each dump file
+# doesn't have to wait for the file to be decompressed.  Note that the
+# uncompressed data is quite large -- around 900MB for BL2 alone.
+
+import os
+import argparse
+from ftexplorer import dumps
+
+parser = argparse.ArgumentParser(
+    description='Pre-warm the uncompressed dump cache for FT-Explorer data',
+    )
+
+parser.add_argument('-m', '--max-size',
+    type=int,
+    help='Maximum total size of the cache, in MiB.  Older files will be evicted to make room.',
+    )
+
+parser.add_argument('cache_dir',
+    help='Cache directory',
+    )
+
+parser.add_argument('games',
+    nargs='*',
+    help='Which game(s) to cache: bl2, tps, and/or aodk (default: all)',
+    )
+
+args = parser.parse_args()
+
+games = []
+for game in args.games or ['bl2', 'tps', 'aodk']:
+    if game.lower() not in ['bl2', 'tps', 'aodk']:
+        parser.error('invalid game: {}'.format(game))
+    game = game.upper()
+    if game == 'AODK':
+        game = 'AoDK'
+    games.append(game)
+
+max_size = None
+if args.max_size is not None:
+    max_size = args.max_size*1024*1024
+cache = dumps.DumpCache(args.cache_dir, max_size=max_size)
+
+for game in games:
+    print('Caching {} Game Data'.format(game))
+    game_dir = os.path.join('resources', game, 'dumps')
+    with os.scandir(game_dir) as it:
+        for entry in sorted(it, key=lambda e: getattr(e, 'name').lower()):
+            if entry.name[-8:] == '.dump.xz' or entry.name[-7:] == '.txt.xz':
+                cache.warm(entry.path, os.path.join(game, os.path.splitext(entry.name)[0]))
+    print()
+
+print('Done!')